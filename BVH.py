@@ -0,0 +1,341 @@
+# BVH.py - Python script for a bounding volume hierarchy over the triangles of a model
+#
+# The hierarchy is stored as flat numpy arrays (node bounds, children and
+# leaf ranges into a triangle permutation), so it can be saved next to the
+# parse cache and loaded again without rebuilding. Nodes are split on the
+# longest axis, either at the centroid median or at the best of a set of
+# binned surface area heuristic (SAH) candidates; the work inside a node is
+# vectorized over its triangles.
+#
+# Supports ray casting (closest hit, for picking, or for a batch of rays
+# traversed together) and box and sphere region queries. Every triangle
+# remembers its geometry and face index.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import numpy as np
+
+import Compile
+
+leafSize = 8
+sahBins = 16
+epsilon = 1e-12
+
+#-------------------------------------------------------------------------------------
+
+class Hit:
+    def __init__(self, triangle, distance, point, geometry, face):
+        self.triangle = triangle    # Triangle index in the BVH
+        self.distance = distance    # Distance along the ray
+        self.point = point          # Hit point
+        self.geometry = geometry    # Index into obj.geometry
+        self.face = face            # Index into obj.geometry[geometry].face
+
+class BVH:
+    def __init__(self):
+        self.triangle = np.zeros((0, 3, 3))          # Triangle corner positions
+        self.geometry = np.zeros(0, dtype=np.int64)  # Geometry of every triangle
+        self.face = np.zeros(0, dtype=np.int64)      # Face of every triangle
+        self.order = np.zeros(0, dtype=np.int64)     # Triangle permutation, leaves are ranges
+        self.low = np.zeros((0, 3))                  # Node bounds
+        self.high = np.zeros((0, 3))
+        self.left = np.zeros(0, dtype=np.int64)      # Child nodes, -1 for leaves
+        self.right = np.zeros(0, dtype=np.int64)
+        self.start = np.zeros(0, dtype=np.int64)     # Leaf range in order
+        self.count = np.zeros(0, dtype=np.int64)
+        self.signature = np.zeros(0)                 # See signature()
+
+    def __len__(self): return len(self.triangle)
+
+    #---------------------------------------------------------------------------------
+
+    def build(self, triangle, geometry, face, method='sah'):
+        self.triangle = np.asarray(triangle, dtype=np.float64).reshape(-1, 3, 3)
+        self.geometry = np.asarray(geometry, dtype=np.int64)
+        self.face = np.asarray(face, dtype=np.int64)
+
+        n = len(self.triangle)
+        self.order = np.arange(n, dtype=np.int64)
+
+        low = self.triangle.min(axis=1)
+        high = self.triangle.max(axis=1)
+        centroid = (low + high) / 2.0
+
+        nodes_low, nodes_high, left, right, start, count = [], [], [], [], [], []
+
+        def add(a, b):
+            items = self.order[a:b]
+            nodes_low.append(low[items].min(axis=0) if b > a else np.zeros(3))
+            nodes_high.append(high[items].max(axis=0) if b > a else np.zeros(3))
+            left.append(-1)
+            right.append(-1)
+            start.append(a)
+            count.append(b - a)
+            return len(left) - 1
+
+        stack = [add(0, n)]
+        while stack:
+            node = stack.pop()
+            a, b = start[node], start[node] + count[node]
+            if b - a <= leafSize: continue
+
+            items = self.order[a:b]
+            c = centroid[items]
+            extent = c.max(axis=0) - c.min(axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] <= epsilon: continue
+
+            if method == 'sah':
+                split = self.sah_split(c[:, axis], low[items], high[items])
+            else:
+                split = None
+
+            if split is None:
+                m = (b - a) // 2
+                self.order[a:b] = items[np.argpartition(c[:, axis], m)]
+            else:
+                below = c[:, axis] < split
+                m = int(np.count_nonzero(below))
+                if m == 0 or m == b - a:
+                    m = (b - a) // 2
+                    self.order[a:b] = items[np.argpartition(c[:, axis], m)]
+                else:
+                    self.order[a:b] = np.concatenate([items[below], items[~below]])
+
+            left[node] = add(a, a + m)
+            right[node] = add(a + m, b)
+            stack.append(left[node])
+            stack.append(right[node])
+
+        self.low = np.array(nodes_low).reshape(-1, 3)
+        self.high = np.array(nodes_high).reshape(-1, 3)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+        return self
+
+    def sah_split(self, c, low, high):  # split position with the lowest binned SAH cost
+        c0, c1 = c.min(), c.max()
+        bins = np.minimum(((c - c0) / (c1 - c0) * sahBins).astype(np.int64), sahBins - 1)
+
+        big = np.finfo(np.float64).max
+        bin_low = np.full((sahBins, 3), big)
+        bin_high = np.full((sahBins, 3), -big)
+        np.minimum.at(bin_low, bins, low)
+        np.maximum.at(bin_high, bins, high)
+        bin_count = np.bincount(bins, minlength=sahBins)
+
+        def areas(lo, hi, n):
+            lo = np.minimum.accumulate(lo)
+            hi = np.maximum.accumulate(hi)
+            d = np.maximum(hi - lo, 0.0)
+            area = d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0]
+            return area * np.cumsum(n)
+
+        forward = areas(bin_low, bin_high, bin_count)[:-1]
+        backward = areas(bin_low[::-1], bin_high[::-1], bin_count[::-1])[::-1][1:]
+        cost = forward + backward
+
+        best = int(np.argmin(cost))
+        if not np.isfinite(cost[best]): return None
+        return c0 + (c1 - c0) * (best + 1) / sahBins
+
+    #---------------------------------------------------------------------------------
+
+    def raycast(self, origin, direction):  # closest hit or None
+        if len(self.left) == 0 or len(self.triangle) == 0: return None
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / direction
+
+        best = (np.inf, -1)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            near = self.slab(node, origin, inverse)
+            if near is None or near > best[0]: continue
+
+            if self.left[node] < 0:
+                a = self.start[node]
+                items = self.order[a:a + self.count[node]]
+                distance = intersect(self.triangle[items], origin, direction)
+                i = int(np.argmin(distance))
+                if distance[i] < best[0]:
+                    best = (float(distance[i]), int(items[i]))
+                continue
+
+            stack.append(self.left[node])
+            stack.append(self.right[node])
+
+        distance, triangle = best
+        if triangle < 0: return None
+        return Hit(triangle, distance, origin + direction * distance,
+                   int(self.geometry[triangle]), int(self.face[triangle]))
+
+    def raycast_all(self, origin, direction):  # closest distance and triangle (-1 on miss) of every ray
+        origin = np.asarray(origin, dtype=np.float64).reshape(-1, 3)
+        direction = np.asarray(direction, dtype=np.float64).reshape(-1, 3)
+        direction = np.broadcast_to(direction, origin.shape)
+
+        distance = np.full(len(origin), np.inf)
+        triangle = np.full(len(origin), -1, dtype=np.int64)
+        if len(self.left) == 0 or len(self.triangle) == 0: return distance, triangle
+
+        inverse = np.copysign(1.0 / np.maximum(np.abs(direction), 1e-300), direction)  # finite, no nan in the slabs
+
+        stack = [(0, np.arange(len(origin)))]
+        while stack:
+            node, rays = stack.pop()
+            o, i = origin[rays], inverse[rays]
+            t0 = (self.low[node] - o) * i
+            t1 = (self.high[node] - o) * i
+            near = np.maximum(np.minimum(t0, t1).max(axis=1), 0.0)
+            far = np.maximum(t0, t1).min(axis=1)
+            rays = rays[(far >= near) & (near <= distance[rays])]
+            if not len(rays): continue
+
+            if self.left[node] < 0:
+                a = self.start[node]
+                items = self.order[a:a + self.count[node]]
+                t = intersect_rays(self.triangle[items], origin[rays], direction[rays])
+                best = np.argmin(t, axis=1)
+                t = t[np.arange(len(rays)), best]
+                closer = t < distance[rays]
+                distance[rays[closer]] = t[closer]
+                triangle[rays[closer]] = items[best[closer]]
+                continue
+
+            stack.append((self.left[node], rays))
+            stack.append((self.right[node], rays))
+
+        return distance, triangle
+
+    def slab(self, node, origin, inverse):
+        with np.errstate(invalid='ignore'):
+            t0 = (self.low[node] - origin) * inverse
+            t1 = (self.high[node] - origin) * inverse
+        t0 = np.nan_to_num(t0, nan=-np.inf)
+        t1 = np.nan_to_num(t1, nan=np.inf)
+        near = np.max(np.minimum(t0, t1))
+        far = np.min(np.maximum(t0, t1))
+        if far < max(near, 0.0): return None
+        return max(near, 0.0)
+
+    def query(self, overlaps, exact):  # triangles in leaves whose bounds overlap the region
+        if len(self.left) == 0 or len(self.triangle) == 0: return np.zeros(0, dtype=np.int64)
+        found = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if not overlaps(self.low[node], self.high[node]): continue
+            if self.left[node] < 0:
+                a = self.start[node]
+                found.append(self.order[a:a + self.count[node]])
+                continue
+            stack.append(self.left[node])
+            stack.append(self.right[node])
+        if not found: return np.zeros(0, dtype=np.int64)
+        items = np.concatenate(found)
+        return np.sort(items[exact(self.triangle[items])])
+
+    def box(self, low, high):  # triangles whose bounds overlap the box
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        def overlaps(a, b): return np.all(a <= high) and np.all(b >= low)
+        def exact(t): return np.all(t.min(axis=1) <= high, axis=1) & np.all(t.max(axis=1) >= low, axis=1)
+        return self.query(overlaps, exact)
+
+    def sphere(self, center, radius):  # triangles whose bounds intersect the sphere
+        center = np.asarray(center, dtype=np.float64)
+        def distance(a, b): return np.sum((center - np.clip(center, a, b)) ** 2, axis=-1)
+        def overlaps(a, b): return distance(a, b) <= radius * radius
+        def exact(t): return distance(t.min(axis=1), t.max(axis=1)) <= radius * radius
+        return self.query(overlaps, exact)
+
+    #---------------------------------------------------------------------------------
+
+    def save(self, file):
+        with open(file, 'wb') as out:
+            np.savez(out, triangle=self.triangle, geometry=self.geometry, face=self.face,
+                     order=self.order, low=self.low, high=self.high, left=self.left,
+                     right=self.right, start=self.start, count=self.count,
+                     signature=self.signature)
+
+    def load(self, file):
+        with np.load(file) as data:
+            for name in data.files:
+                setattr(self, name, data[name])
+        return self
+
+#-------------------------------------------------------------------------------------
+
+def intersect(triangle, origin, direction):  # Moller-Trumbore, distance or inf per triangle
+    p0 = triangle[:, 0]
+    e1 = triangle[:, 1] - p0
+    e2 = triangle[:, 2] - p0
+    p = np.cross(direction, e2)
+    det = np.einsum('ij,ij->i', e1, p)
+    valid = np.abs(det) > epsilon
+    inverse = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    s = origin - p0
+    u = np.einsum('ij,ij->i', s, p) * inverse
+    q = np.cross(s, e1)
+    v = (q @ direction) * inverse
+    t = np.einsum('ij,ij->i', e2, q) * inverse
+    hit = valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > epsilon)
+    return np.where(hit, t, np.inf)
+
+def cross(a, b):  # np.cross without the axis handling, for small arrays in tight loops
+    return np.stack([a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1],
+                     a[..., 2] * b[..., 0] - a[..., 0] * b[..., 2],
+                     a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]], axis=-1)
+
+def intersect_rays(triangle, origin, direction):  # Moller-Trumbore, (rays, triangles) distances or inf
+    p0 = triangle[None, :, 0]
+    e1 = triangle[None, :, 1] - p0
+    e2 = triangle[None, :, 2] - p0
+    d = direction[:, None, :]
+    p = cross(d, e2)
+    det = (e1 * p).sum(axis=-1)
+    valid = np.abs(det) > epsilon
+    inverse = np.where(valid, 1.0 / np.where(valid, det, 1.0), 0.0)
+    s = origin[:, None, :] - p0
+    u = (s * p).sum(axis=-1) * inverse
+    q = cross(s, e1)
+    v = (q * d).sum(axis=-1) * inverse
+    t = (e2 * q).sum(axis=-1) * inverse
+    hit = valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > epsilon)
+    return np.where(hit, t, np.inf)
+
+def build(obj, method='sah'):
+    index, geometry, face = Compile.triangles(obj, faces=True)
+    vertex = np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3)
+    return BVH().build(vertex[index], geometry, face, method)
+
+def signature(obj):  # cheap fingerprint of the vertex positions and faces a BVH was built from
+    vertex = np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3)
+    faces = [len(geometry.face) for geometry in obj.geometry]
+    return np.concatenate([[len(vertex), sum(faces), len(faces)], vertex.sum(axis=0), np.abs(vertex).sum(axis=0)])
+
+def cached(obj, file, precision='float64', method='sah'):  # BVH stored next to the parse cache
+    import Cache
+    path = Cache.path(file, precision, '.bvh.npz')
+    current = signature(obj)
+    if os.path.exists(path):
+        bvh = BVH().load(path)
+        previous = np.asarray(getattr(bvh, 'signature', []))
+        if previous.shape == current.shape and np.allclose(previous, current):
+            return bvh
+    bvh = build(obj, method)
+    bvh.signature = current
+    os.makedirs(Cache.directory, exist_ok=True)
+    bvh.save(path)
+    return bvh
@@ -0,0 +1,225 @@
+# Batch.py - Python script for processing directories of wavefront obj files
+#
+# Walks a directory tree and processes every .obj file in a pool of worker
+# processes: validate it with one streaming scan (see Inspect.py), parse
+# it, optionally warm the parse cache (see Cache.py) and optionally export
+# to ply, stl or glb. With --scan-only a file is only parsed when it is
+# cached or exported. Each file runs under a timeout and each worker under
+# an address space limit. Material libraries are loaded once per
+# worker and reused by all files that share them. The results are written
+# as one json or csv summary with throughput in MB/s and files/s.
+#
+# Timeouts and memory caps use SIGALRM and resource limits, so they are
+# only enforced on POSIX systems.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import sys
+import csv
+import json
+import time
+import signal
+import argparse
+import multiprocessing
+
+from Lazy import lazy
+from Storage import precisions
+
+Cache = lazy('Cache')
+Export = lazy('Export')
+Inspect = lazy('Inspect')
+OBJ = lazy('WavefrontOBJ')
+MTL = lazy('WavefrontMTL')
+
+#-------------------------------------------------------------------------------------
+
+class Timeout(Exception):
+    pass
+
+materials = {}   # (path, mtime) -> WavefrontMTL, shared by the files of one worker
+options = {}
+
+def shared_mtl(file):
+    key = (os.path.abspath(file), os.path.getmtime(file))
+    mtl = materials.get(key)
+    if mtl is None:
+        mtl = MTL.WavefrontMTL()
+        mtl.load(file)
+        materials[key] = mtl
+    return mtl
+
+def alarm(signum, frame):
+    raise Timeout()
+
+def init_worker(settings):
+    options.update(settings)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, alarm)
+    if settings.get('memory'):
+        try:
+            import resource
+            limit = int(settings['memory'] * 2**20)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass
+
+def set_alarm(seconds):
+    if seconds and hasattr(signal, 'SIGALRM'):
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+
+def clear_alarm():
+    if hasattr(signal, 'SIGALRM'):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+#-------------------------------------------------------------------------------------
+
+def export_path(file, options):
+    name = os.path.splitext(file)[0] + '.' + options['export']
+    if not options.get('output'): return name
+    relative = os.path.relpath(name, options['root'])
+    return os.path.join(options['output'], relative)
+
+def process(file):
+    result = {'file': file, 'size': os.path.getsize(file), 'status': 'ok', 'error': '',
+              'parse': 0.0, 'validate': 0.0, 'cache': 0.0, 'export': 0.0,
+              'vertices': 0, 'faces': 0, 'degenerate': 0, 'out_of_range': 0, 'malformed': 0,
+              'missing_materials': 0, 'missing_textures': 0}
+
+    set_alarm(options.get('timeout'))
+    try:
+        start = time.perf_counter()
+        report = Inspect.inspect(file, shared_mtl)
+        result['validate'] = time.perf_counter() - start
+        result['vertices'] = report.counts['v']
+        result['faces'] = report.counts['f']
+        result['degenerate'] = report.degenerate
+        result['out_of_range'] = sum(report.out_of_range.values())
+        result['malformed'] = sum(report.malformed.values())
+        result['missing_materials'] = len(report.missing_materials)
+        result['missing_textures'] = len(report.missing_textures)
+        missing_mtl = not report.mtl_found and report.needs_mtl()
+        if result['out_of_range'] or result['malformed'] or missing_mtl or report.missing_materials:
+            result['status'] = 'invalid'
+
+        cache = options.get('cache') and not result['malformed']   # the parser cannot read malformed records
+        export = options.get('export') and result['status'] == 'ok'
+        parse = not options.get('scan_only') and not result['malformed']
+        if not cache and not export and not parse: return result  # --scan-only, the file is read once
+
+        start = time.perf_counter()
+        obj = OBJ.WavefrontOBJ()
+        obj.load(file, options.get('precision', 'float64'))
+        result['parse'] = time.perf_counter() - start
+
+        if cache:
+            start = time.perf_counter()
+            Cache.store(obj, file, options.get('precision', 'float64'))
+            result['cache'] = time.perf_counter() - start
+
+        if export:
+            start = time.perf_counter()
+            target = export_path(file, options)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            mtl = shared_mtl(MTL.mtlFile(obj.mtllib)) if os.path.exists(MTL.mtlFile(obj.mtllib)) else None
+            Export.export(obj, target, mtl)
+            result['export'] = time.perf_counter() - start
+
+    except Timeout:
+        result['status'] = 'timeout'
+    except MemoryError:
+        result['status'] = 'memory'
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = f"{type(error).__name__}: {error}"
+    finally:
+        clear_alarm()
+
+    return result
+
+def find(directory):
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith('.obj'):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+def run(files, settings, workers):
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(settings,)) as pool:
+        for result in pool.imap_unordered(process, files):
+            print(f"batch: {result['status']:<8} {result['file']}")
+            results.append(result)
+    elapsed = time.perf_counter() - start
+    return sorted(results, key=lambda r: r['file']), elapsed
+
+#-------------------------------------------------------------------------------------
+
+def summary(results, elapsed):
+    size = sum(result['size'] for result in results)
+    status = {}
+    for result in results:
+        status[result['status']] = status.get(result['status'], 0) + 1
+    return {'files': len(results),
+            'bytes': size,
+            'seconds': elapsed,
+            'mb_per_second': size / 2**20 / elapsed if elapsed else 0.0,
+            'files_per_second': len(results) / elapsed if elapsed else 0.0,
+            'status': status}
+
+def write(output, results, total):
+    if output.lower().endswith('.csv'):
+        with open(output, 'w', newline='') as out:
+            writer = csv.DictWriter(out, fieldnames=list(results[0].keys()) if results else ['file'])
+            writer.writeheader()
+            writer.writerows(results)
+        with open(os.path.splitext(output)[0] + '.summary.json', 'w') as out:
+            json.dump(total, out, indent=2)
+    else:
+        with open(output, 'w') as out:
+            json.dump({'summary': total, 'files': results}, out, indent=2)
+
+description = 'Parse and validate all Wavefront .obj files in a directory tree'
+
+def main():
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('directory', help='Directory to search for .obj files')
+    parser.add_argument('-o', '--output', default='batch.json', help='Summary file (.json or .csv)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('-t', '--timeout', type=float, default=300.0, help='Seconds allowed per file')
+    parser.add_argument('-m', '--memory', type=float, default=None, help='Address space limit per worker in MB')
+    parser.add_argument('-c', '--cache', action='store_true', help='Warm the parse cache')
+    parser.add_argument('-p', '--precision', default='float64', choices=precisions, help='Storage precision used for the parse cache (float64, float32 or quantized16)')
+    parser.add_argument('-e', '--export', choices=('ply', 'stl', 'glb'), help='Export every model to this format')
+    parser.add_argument('--scan-only', action='store_true', help='Validate with the streaming scan only, parse only to cache or export')
+    parser.add_argument('--export-dir', help='Directory for exported files (default next to the .obj)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: The directory {args.directory} does not exist.")
+        return
+
+    files = find(args.directory)
+
+    settings = {'timeout': args.timeout, 'memory': args.memory,
+                'cache': args.cache, 'precision': args.precision, 'scan_only': args.scan_only,
+                'export': args.export, 'output': args.export_dir, 'root': args.directory}
+
+    results, elapsed = run(files, settings, max(1, args.jobs))
+    total = summary(results, elapsed)
+    write(args.output, results, total)
+
+    print(f"batch: {total['files']} files / {total['mb_per_second']:.1f} MB/s / "
+          f"{total['files_per_second']:.1f} files/s / {total['status']}")
+
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+     main()
@@ -0,0 +1,240 @@
+# Benchmark.py - Python script for timing the load stages on synthetic models
+#
+# Generates deterministic synthetic models (see Synthetic.py), times each
+# stage (obj parse, mtl parse, aabb, triangulation, scene compilation and
+# the binary exporters, plus a ply and a text obj round trip) and compares
+# the result with a json baseline. A stage that is slower than the baseline
+# by more than the threshold is reported as a regression and the script
+# exits with a non-zero status. Stages faster than a minimum (5 ms by
+# default) are not compared, their timings are mostly noise. Nothing here
+# imports VPython, so it runs headless.
+#
+# The startup check runs the command line tools with python -X importtime
+# and fails when their imports exceed a time budget or when --help or an
+# argument error pulls in VPython, numpy or the texture helpers.
+# --startup-only runs just that check, fast enough for every commit, and
+# test_startup.py runs it under pytest.
+#
+# With --differential the correctness check of Differential.py is run
+# first, on the given number of random cases, and fails on any mismatch.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import Synthetic
+import Triangulate
+import Compile
+import Export
+import Differential
+
+from WavefrontOBJ import *
+from WavefrontMTL import *
+
+#-------------------------------------------------------------------------------------
+
+scenarios = {
+    'triangles': dict(mix=(1.0, 0.0, 0.0), texture=False, normal=True, materials=1),
+    'mixed':     dict(mix=(0.5, 0.3, 0.2), concave=0.3, texture=True, normal=True, materials=8),
+    'ngons':     dict(mix=(0.0, 0.0, 1.0), concave=0.5, texture=False, normal=False, materials=2),
+    'negative':  dict(mix=(0.6, 0.4, 0.0), negative=1.0, texture=True, normal=False, materials=4),
+}
+
+#-------------------------------------------------------------------------------------
+
+def timed(function, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+def polygons(obj):
+    items = []
+    for geometry in obj.geometry:
+        for face in geometry.face:
+            if len(face.vertex) <= 4: continue
+            items.append([obj.vertex[i] for i in face.vertex])
+    return items
+
+def triangulate_all(items):
+    for corners in items:
+        polygon = [Triangulate.Point(p[0], p[1], p[2], i) for i, p in enumerate(corners)]
+        Triangulate.triangulate(polygon)
+
+def load_obj(file):
+    obj = WavefrontOBJ()
+    obj.load(file)
+    return obj
+
+def load_mtl(file):
+    mtl = WavefrontMTL()
+    mtl.load(file)
+    return mtl
+
+def round_trip(obj, file):
+    if file.endswith('.ply'):
+        Export.write_ply(obj, file)
+        return Export.read_ply(file)
+    Export.write_obj(obj, file)
+    return load_obj(file)
+
+def run_scenario(file, repeat):
+    result = {'size': os.path.getsize(file)}
+    base = os.path.splitext(file)[0]
+
+    result['parse'], obj = timed(lambda: load_obj(file), repeat)
+    result['mtl'], _ = timed(lambda: load_mtl(obj.mtllib), repeat)
+    result['aabb'], _ = timed(obj.aabb, repeat)
+
+    items = polygons(obj)
+    result['triangulate'], _ = timed(lambda: triangulate_all(items), repeat)
+    result['compile'], _ = timed(lambda: Compile.meshes(obj), repeat)
+
+    for extension in ('ply', 'stl', 'glb'):
+        result[extension], _ = timed(lambda: Export.export(obj, f"{base}.out.{extension}"), repeat)
+
+    result['ply.trip'], _ = timed(lambda: round_trip(obj, f"{base}.trip.ply"), repeat)
+    result['obj.trip'], _ = timed(lambda: round_trip(obj, f"{base}.trip.obj"), repeat)
+
+    return result
+
+def run(faces, repeat, names, directory):
+    results = {}
+    for name in names:
+        file = os.path.join(directory, f"{name}.obj")
+        Synthetic.generate(file, faces=faces, seed=1, **scenarios[name])
+        results[name] = run_scenario(file, repeat)
+        print_result(name, results[name])
+    return results
+
+#-------------------------------------------------------------------------------------
+
+startupScripts = [('Explorer.py', ['--help']), ('Inspect.py', ['--help']), ('Batch.py', ['--help']),
+                  ('Explorer.py', ['objFiles/rubikcube.obj', '--watch', '--server']),  # argument errors stop before loading too
+                  ('Batch.py', ['objFiles', '-p', 'float16'])]
+
+startupForbidden = ('vpython', 'vpythonex', 'numpy', 'MapTextures')
+
+startupBudget = 50.0   # ms
+
+def import_times(script, arguments):  # [(module, cumulative us)] for the imports done after site
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-X', 'importtime', os.path.join(here, script)] + arguments
+    process = subprocess.run(command, capture_output=True, text=True, cwd=here)
+    modules = []
+    started = False
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:'): continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit(): continue
+        name = fields[2][1:].rstrip()
+        if name.strip() == 'site' and not name.startswith(' '):
+            started = True
+            continue
+        if started:
+            modules.append((name, int(fields[1])))
+    return modules
+
+def startup(budget):  # returns a list of failures
+    failures = []
+    for script, arguments in startupScripts:
+        argument = ' '.join(arguments)
+        modules = import_times(script, arguments)
+        total = sum(cumulative for name, cumulative in modules if not name.startswith(' ')) / 1000.0
+        names = {name.strip().split('.')[0] for name, _ in modules}   # lazily loaded packages only show their submodules
+        forbidden = [name for name in startupForbidden if name in names]
+        print(f"startup: {script:<12} {argument} {total:7.1f} ms (budget {budget:.0f} ms)")
+        if total > budget:
+            failures.append(f"{script} {argument} imports take {total:.1f} ms")
+        if forbidden:
+            failures.append(f"{script} {argument} imports {', '.join(forbidden)}")
+    for failure in failures:
+        print(f"regression: startup / {failure}")
+    return failures
+
+#-------------------------------------------------------------------------------------
+
+def print_result(name, result):
+    stages = ' / '.join(f"{key} {value:.3f} s" for key, value in result.items() if key != 'size')
+    print(f"benchmark: {name:<10} {result['size'] / 2**20:6.1f} MB / {stages}")
+
+def compare(results, baseline, threshold, minimum=0.005):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None: continue
+        for stage, value in result.items():
+            if stage == 'size' or stage not in reference: continue
+            if value < minimum: continue   # too short to time reliably
+            if value > reference[stage] * (1.0 + threshold):
+                regressions.append((name, stage, reference[stage], value))
+    for name, stage, before, after in regressions:
+        print(f"regression: {name} / {stage} {before:.3f} s -> {after:.3f} s ({after / before - 1.0:+.0%})")
+    return regressions
+
+def environment():
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'system': platform.system()}
+
+#-------------------------------------------------------------------------------------
+
+description = 'Benchmark the load stages on synthetic wavefront .obj models'
+
+def main():
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-f', '--faces', type=int, default=20000, help='Number of faces per model')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of runs per stage (median is used)')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(scenarios), help='Scenario to run (default all)')
+    parser.add_argument('--save', metavar='BASELINE', help='Write the results as a json baseline')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare with a json baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown before reporting a regression')
+    parser.add_argument('--minimum', type=float, default=5.0, metavar='MS', help='Stages faster than this are not compared')
+    parser.add_argument('--startup-budget', type=float, default=startupBudget, metavar='MS', help='Import time budget of the command line tools')
+    parser.add_argument('--startup-only', action='store_true', help='Only run the startup check of the command line tools')
+    parser.add_argument('--differential', type=int, default=0, metavar='CASES', help='Also run the differential check on this many random cases')
+    args = parser.parse_args()
+
+    failed = bool(startup(args.startup_budget))
+
+    if args.startup_only:
+        sys.exit(1 if failed else 0)
+
+    if args.differential > 0 and Differential.run(args.differential):
+        failed = True
+
+    names = args.scenario or list(scenarios)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(args.faces, args.repeat, names, directory)
+
+    if args.save:
+        with open(args.save, 'w') as out:
+            json.dump({'faces': args.faces, 'environment': environment(), 'results': results}, out, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get('faces') != args.faces:
+            print(f"Warning: baseline was recorded with {baseline.get('faces')} faces")
+        if compare(results, baseline['results'], args.threshold, args.minimum / 1000.0):
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+     main()
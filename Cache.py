@@ -0,0 +1,66 @@
+# Cache.py - Python script for caching parsed wavefront obj models
+#
+# A parsed WavefrontOBJ is pickled to a cache directory, keyed by the
+# absolute path, size and modification time of the obj file and the
+# storage precision. Loading a cached model skips the text parsing
+# entirely. The cache directory can be set with OBJEXPLORER_CACHE.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import pickle
+import hashlib
+
+import Profiler as profile
+
+from WavefrontOBJ import WavefrontOBJ
+
+version = 4   # Bump when the parse result or the pickled layout of WavefrontOBJ changes
+
+directory = os.environ.get('OBJEXPLORER_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'pyOBJExplorer'))
+
+#-------------------------------------------------------------------------------------
+
+def key(file, precision='float64'):
+    stat = os.stat(file)
+    text = f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime_ns}|{precision}|{version}"
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def path(file, precision='float64', extension='.pickle'):
+    return os.path.join(directory, key(file, precision) + extension)
+
+def load(file, precision='float64'):
+    cached = path(file, precision)
+    if not os.path.exists(cached):
+        profile.count('cache.miss')
+        return None
+    try:
+        with open(cached, 'rb') as buffer:
+            obj = pickle.load(buffer)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError):
+        profile.count('cache.miss')   # damaged, or pickled by code that has changed since: parse again
+        return None
+    profile.count('cache.hit')
+    return obj
+
+def store(obj, file, precision='float64'):
+    os.makedirs(directory, exist_ok=True)
+    cached = path(file, precision)
+    temporary = cached + f".{os.getpid()}.tmp"
+    with open(temporary, 'wb') as buffer:
+        pickle.dump(obj, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, cached)
+    return cached
+
+def load_obj(file, precision='float64'):  # cached model, parsed and stored on a miss
+    obj = load(file, precision)
+    if obj is not None: return obj
+    obj = WavefrontOBJ()
+    obj.load(file, precision)
+    store(obj, file, precision)
+    return obj
@@ -0,0 +1,234 @@
+# Compile.py - Python script for compiling wavefront obj geometries to triangle arrays
+#
+# Turns every geometry into dense triangle arrays (corner positions, corner
+# normals and corner texture coordinates) that can be handed to a renderer
+# or an exporter without touching the Face objects again. Quads are split
+# in two, n-gons go through Triangulate. Corners without normals get the
+# flat triangle normal, n-gons get the polygon normal like in Explorer.
+#
+# The work is done per face bucket (see WavefrontOBJ.Bucket): triangles and
+# quads of one attribute layout are gathered with a single index operation,
+# only n-gons are visited one by one. The triangles are then put back in
+# face order, so the result is the same as compiling face by face
+# (compile_faces, kept as the reference).
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import numpy as np
+import Triangulate
+
+#-------------------------------------------------------------------------------------
+
+class Mesh:
+    def __init__(self, material):
+        self.material = material                # Material name
+        self.position = np.zeros((0, 3, 3))     # Triangle corner positions
+        self.normal = np.zeros((0, 3, 3))       # Triangle corner normals
+        self.texpos = None                      # Triangle corner texture coordinates
+        self.face = np.zeros(0, dtype=np.int64) # Source face of every triangle
+
+    def __len__(self): return len(self.position)
+
+    def nbytes(self):
+        size = self.position.nbytes + self.normal.nbytes + self.face.nbytes
+        if self.texpos is not None: size += self.texpos.nbytes
+        return size
+
+#-------------------------------------------------------------------------------------
+
+def flat_normals(position):
+    n = np.cross(position[:, 1] - position[:, 0], position[:, 2] - position[:, 1])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    np.divide(n, length, out=n, where=length > 0.0)
+    return n
+
+def triangulate(obj, vertex):  # corner indices (into the face) and polygon normal
+    polygon = []
+    for corner, i in enumerate(vertex):
+        p = obj.vertex[i]
+        polygon.append(Triangulate.Point(p[0], p[1], p[2], corner))
+
+    triangles, normal = Triangulate.triangulate(polygon)
+
+    corners = [(t.p0.i, t.p1.i, t.p2.i) for t in triangles]
+    return corners, np.array([normal.x, normal.y, normal.z])
+
+def corner_lists(obj, geometry):
+    corners = []    # (face, c0, c1, c2) corner indices into the face
+    normals = {}    # row -> polygon normal for triangulated n-gons
+
+    for f, face in enumerate(geometry.face):
+        if face is None: continue
+        size = len(face.vertex)
+        if size < 3: continue
+
+        if size == 3:
+            corners.append((f, 0, 1, 2))
+        elif size == 4:
+            corners.append((f, 0, 1, 2))
+            corners.append((f, 0, 2, 3))
+        else:
+            triangles, normal = triangulate(obj, face.vertex)
+            for c0, c1, c2 in triangles:
+                normals[len(corners)] = normal
+                corners.append((f, c0, c1, c2))
+
+    return np.array(corners, dtype=np.int64).reshape(-1, 4), normals
+
+def gather(faces, attribute, face, corner, size):  # index arrays for one face attribute
+    complete = np.array([len(getattr(faces[f], attribute)) == size[f] for f in face.tolist()], dtype=bool)
+    index = np.zeros(corner.shape, dtype=np.int64)
+    for row in np.flatnonzero(complete).tolist():
+        items = getattr(faces[face[row]], attribute)
+        index[row] = [items[c] for c in corner[row]]
+    return index, complete
+
+def face_sizes(faces):
+    return np.array([len(f.vertex) if f is not None else 0 for f in faces], dtype=np.int64)
+
+patterns = {3: np.array([[0, 1, 2]]), 4: np.array([[0, 1, 2], [0, 2, 3]])}
+
+class Corners:  # triangles of a geometry as index arrays, in face order
+    def __init__(self, count):
+        self.face = np.zeros(count, dtype=np.int64)             # Source face
+        self.vertex = np.zeros((count, 3), dtype=np.int64)      # Vertex indices
+        self.texture = np.zeros((count, 3), dtype=np.int64)     # Texture indices where has_texture
+        self.normal = np.zeros((count, 3), dtype=np.int64)      # Normal indices where has_normal
+        self.has_texture = np.zeros(count, dtype=bool)
+        self.has_normal = np.zeros(count, dtype=bool)
+        self.polygon = np.zeros((count, 3))                     # Polygon normal where is_polygon
+        self.is_polygon = np.zeros(count, dtype=bool)
+
+    def __len__(self): return len(self.face)
+
+def bucket_corners(obj, bucket, attributes):  # face, triangle number in the face and index arrays
+    names = ('vertex', 'texture', 'normal') if attributes else ('vertex',)
+
+    if bucket.size:
+        pattern = patterns[bucket.size]
+        row = np.repeat(np.arange(len(bucket)), len(pattern))
+        corner = np.tile(pattern, (len(bucket), 1))
+        index = {name: getattr(bucket, name)[row[:, None], corner] for name in names
+                 if getattr(bucket, name) is not None}
+        return bucket.face[row], np.tile(np.arange(len(pattern)), len(bucket)), index, None
+
+    face, sequence, polygon = [], [], []
+    index = {name: [] for name in names if getattr(bucket, name) is not None}
+    polygons = {name: bucket.polygons(name) for name in index}
+    for i, vertex in enumerate(polygons['vertex']):
+        triangles, normal = triangulate(obj, vertex.tolist())
+        corner = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+        face.append(np.full(len(corner), bucket.face[i]))
+        sequence.append(np.arange(len(corner)))
+        polygon.append(np.repeat(normal[None, :], len(corner), axis=0))
+        for name in index:
+            index[name].append(polygons[name][i][corner])
+
+    if not face:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), {}, np.zeros((0, 3))
+    index = {name: np.concatenate(items) for name, items in index.items()}
+    return np.concatenate(face), np.concatenate(sequence), index, np.concatenate(polygon)
+
+def geometry_corners(obj, geometry, attributes=True):
+    parts = [bucket_corners(obj, bucket, attributes) for bucket in geometry.buckets().values()]
+    count = sum(len(face) for face, _, _, _ in parts)
+    corners = Corners(count)
+    if not count: return corners
+
+    face = np.concatenate([face for face, _, _, _ in parts])
+    sequence = np.concatenate([sequence for _, sequence, _, _ in parts])
+    order = np.lexsort((sequence, face))
+
+    rows = np.empty(count, dtype=np.int64)
+    rows[order] = np.arange(count)  # destination row of every triangle
+    corners.face = face[order]
+
+    start = 0
+    for face, _, index, polygon in parts:
+        target = rows[start:start + len(face)]
+        start += len(face)
+        corners.vertex[target] = index['vertex']
+        if 'texture' in index:
+            corners.texture[target] = index['texture']
+            corners.has_texture[target] = True
+        if 'normal' in index:
+            corners.normal[target] = index['normal']
+            corners.has_normal[target] = True
+        if polygon is not None:
+            corners.polygon[target] = polygon
+            corners.is_polygon[target] = True
+
+    return corners
+
+def triangle_indices(obj, geometry):  # (n, 3) vertex indices and source face of the triangles of one geometry
+    corners = geometry_corners(obj, geometry, attributes=False)
+    return corners.vertex, corners.face
+
+def triangles(obj, faces=False):  # (n, 3) vertex indices and the geometry (and face) of every triangle
+    items = [triangle_indices(obj, geometry) for geometry in obj.geometry]
+    geometry = np.repeat(np.arange(len(items)), [len(index) for index, _ in items])
+    if items:
+        index = np.concatenate([index for index, _ in items])
+        face = np.concatenate([face for _, face in items])
+    else:
+        index, face = np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if faces: return index, geometry, face
+    return index, geometry
+
+def compile_geometry(obj, geometry):
+    mesh = Mesh(geometry.material)
+
+    corners = geometry_corners(obj, geometry)
+    if len(corners) == 0: return mesh
+
+    mesh.face = corners.face
+    mesh.position = np.asarray(obj.vertex[corners.vertex.reshape(-1)], dtype=np.float64).reshape(-1, 3, 3)
+
+    mesh.normal = np.repeat(flat_normals(mesh.position)[:, None, :], 3, axis=1)
+    complete = corners.has_normal & ~corners.is_polygon
+    if np.any(complete):
+        mesh.normal[complete] = np.asarray(obj.normal[corners.normal[complete].reshape(-1)]).reshape(-1, 3, 3)
+    mesh.normal[corners.is_polygon] = corners.polygon[corners.is_polygon][:, None, :]
+
+    if np.all(corners.has_texture) and len(obj.texture):
+        mesh.texpos = np.asarray(obj.texture[corners.texture.reshape(-1)], dtype=np.float64).reshape(-1, 3, 3)
+
+    return mesh
+
+def compile_faces(obj, geometry):  # face by face reference for compile_geometry
+    mesh = Mesh(geometry.material)
+
+    corners, polygon_normals = corner_lists(obj, geometry)
+    if len(corners) == 0: return mesh
+
+    faces = geometry.face
+    face = corners[:, 0]
+    corner = corners[:, 1:]
+    size = face_sizes(faces)
+
+    vertex, _ = gather(faces, 'vertex', face, corner, size)
+
+    mesh.face = face
+    mesh.position = np.asarray(obj.vertex[vertex.reshape(-1)], dtype=np.float64).reshape(-1, 3, 3)
+
+    normal, complete = gather(faces, 'normal', face, corner, size)
+    for row in polygon_normals: complete[row] = False
+
+    mesh.normal = np.repeat(flat_normals(mesh.position)[:, None, :], 3, axis=1)
+    if np.any(complete):
+        mesh.normal[complete] = np.asarray(obj.normal[normal[complete].reshape(-1)]).reshape(-1, 3, 3)
+    for row, n in polygon_normals.items():
+        mesh.normal[row] = n
+
+    texture, complete = gather(faces, 'texture', face, corner, size)
+    if np.all(complete) and len(obj.texture):
+        mesh.texpos = np.asarray(obj.texture[texture.reshape(-1)], dtype=np.float64).reshape(-1, 3, 3)
+
+    return mesh
+
+def meshes(obj):
+    return [compile_geometry(obj, geometry) for geometry in obj.geometry]
@@ -0,0 +1,522 @@
+# Differential.py - Python script for checking the fast paths against reference code
+#
+# Generates random wavefront obj and mtl files from a seed, with the edge
+# cases real exporters write: negative (relative) indices, missing
+# components (v, v/vt, v//vn and corners that leave one out), blank and
+# repeated usemtl, faces before the first usemtl, collinear, concave and
+# degenerate polygons, points, lines, comments, tabs and \r\n line ends.
+# Every case is run through a reference and an optimized engine side by
+# side and the results are compared within a tolerance:
+#
+# parse      line by line reference parser     WavefrontOBJ.load
+# append     WavefrontOBJ.load of the file     load of a part + WavefrontOBJ.append
+# buckets    Face objects                      WavefrontOBJ.Bucket index arrays
+# compile    Compile.compile_faces             Compile.compile_geometry
+# geometries compile_faces of a material view   compile_geometry of the view (joined buckets)
+# precision  float64                           float32 and quantized16 within obj.error
+# triangles  polygon area and corner count     Triangulate on every n-gon
+# mtl        line by line reference parser     WavefrontMTL.load and material()
+# raycast    BVH.raycast per ray               BVH.raycast_all
+#
+# The time of both sides is summed per check. A mismatch is printed with the
+# seed of its case (rerun it with --seed and -n 1, --keep writes the files)
+# and the script exits with a non-zero status. Nothing here needs a network
+# or VPython. Benchmark.py can run it too (--differential).
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+import BVH
+import Compile
+import WavefrontOBJ as OBJ
+from WavefrontMTL import WavefrontMTL, Material
+
+tolerance = 1e-9    # Relative tolerance of the float comparisons
+rays = 64           # Rays per case for the raycast check
+
+#-------------------------------------------------------------------------------------
+
+def number(rng, x):  # the float formats exporters write
+    style = int(rng.integers(5))
+    if style == 0: return f"{x:.6f}"
+    if style == 1: return f"{x:.9g}"
+    if style == 2: return f"{x:.4e}"
+    if style == 3: return f"{round(x)}"
+    return repr(float(x))
+
+def rotation(rng):
+    q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    return q * np.sign(np.diag(r))
+
+def shape(rng, n, kind):  # corners of a planar polygon, rotated and moved
+    angle = (np.arange(n) + rng.uniform(0.0, 0.8, n)) * 2.0 * np.pi / n  # gaps below pi, so it is simple
+    radius = np.ones(n)
+    if kind == 'concave':
+        radius = rng.uniform(0.2, 1.0, n)
+        radius[::2] = 1.0
+    corners = np.stack([radius * np.cos(angle), radius * np.sin(angle), np.zeros(n)], axis=1)
+    if kind == 'collinear':
+        corners = np.zeros((n, 3))
+        corners[:, 0] = np.sort(rng.uniform(-1.0, 1.0, n))
+    if kind == 'midpoints':  # convex polygon with a corner on the middle of every edge
+        half = corners[:max(3, n // 2)]
+        middle = (half + np.roll(half, -1, axis=0)) / 2.0
+        corners = np.stack([half, middle], axis=1).reshape(-1, 3)
+    return corners @ rotation(rng).T * rng.uniform(0.1, 10.0) + rng.uniform(-50.0, 50.0, 3)
+
+class Writer:  # obj lines and the counts needed for relative indices
+    def __init__(self, rng):
+        self.rng = rng
+        self.lines = []
+        self.nv = self.nt = self.nn = 0
+
+    def add(self, *words):
+        rng = self.rng
+        gap = [' ', ' ', ' ', '  ', '\t'][int(rng.integers(5))]
+        indent = ' ' if rng.random() < 0.05 else ''
+        self.lines.append(indent + gap.join(words))
+
+    def ref(self, i, count):  # positive or negative index of item i
+        if self.rng.random() < 0.4: return str(i - count)
+        return str(i + 1)
+
+    def vertex(self, p, exact=False):  # polygon corners are written exactly, so they stay planar
+        self.add('v', *(repr(float(x)) if exact else number(self.rng, x) for x in p))
+        self.nv += 1
+
+    def texture(self):
+        u, v, w = self.rng.random(3)
+        words = [number(self.rng, u), number(self.rng, v)]
+        if self.rng.random() < 0.2: words.append(number(self.rng, w))
+        self.add('vt', *words)
+        self.nt += 1
+
+    def normal(self):
+        n = self.rng.normal(size=3)
+        self.add('vn', *(number(self.rng, x) for x in n / np.linalg.norm(n)))
+        self.nn += 1
+
+    def face(self, vertex):
+        rng = self.rng
+        layout = int(rng.integers(4))   # index into WavefrontOBJ.layouts
+        missing = len(vertex) if rng.random() > 0.05 else int(rng.integers(len(vertex)))
+        corners = []
+        for c, i in enumerate(vertex):
+            v = self.ref(i, self.nv)
+            t = self.ref(int(rng.integers(self.nt)), self.nt) if layout & 1 and c != missing else ''
+            n = self.ref(int(rng.integers(self.nn)), self.nn) if layout & 2 and c != missing else ''
+            if n: corners.append(f"{v}/{t}/{n}")
+            elif t: corners.append(f"{v}/{t}")
+            else: corners.append(v)
+        self.add('f', *corners)
+
+def generate_obj(rng, file, materials):
+    w = Writer(rng)
+    w.add('#', 'random case')
+    w.add('mtllib', os.path.splitext(os.path.basename(file))[0] + '.mtl')
+
+    for _ in range(int(rng.integers(4, 40))): w.vertex(rng.uniform(-50.0, 50.0, 3))
+    for _ in range(int(rng.integers(1, 12))): w.texture()
+    for _ in range(int(rng.integers(1, 12))): w.normal()
+
+    kinds = ['triangle', 'quad', 'ngon', 'point', 'line', 'vertex', 'degenerate', 'other']
+    weights = np.array([30, 20, 20, 3, 3, 10, 4, 10], dtype=float)
+
+    for block in range(int(rng.integers(1, 7))):
+        material = rng.random()
+        if block == 0 and material < 0.3: pass     # faces before the first usemtl
+        elif material < 0.15: w.add('usemtl')
+        elif material < 0.95: w.add('usemtl', materials[int(rng.integers(len(materials)))])
+
+        for _ in range(int(rng.integers(0, 30))):
+            kind = kinds[rng.choice(len(kinds), p=weights / weights.sum())]
+            if kind in ('triangle', 'quad'):
+                size = 3 if kind == 'triangle' else 4
+                w.face(rng.choice(w.nv, size=size, replace=w.nv < size).tolist())
+            elif kind == 'ngon':
+                n = int(rng.integers(5, 10))
+                polygon = shape(rng, n, ['convex', 'concave', 'collinear', 'midpoints'][int(rng.integers(4))])
+                first = w.nv
+                for p in polygon: w.vertex(p, exact=True)
+                vertex = list(range(first, first + len(polygon)))
+                if rng.random() < 0.1:  # repeated corner
+                    c = int(rng.integers(len(vertex)))
+                    vertex.insert(c, vertex[c])
+                w.face(vertex)
+            elif kind == 'degenerate':  # fewer than three corners or all corners the same
+                i = int(rng.integers(w.nv))
+                w.face([i] * int(rng.integers(1, 5)) if rng.random() < 0.5 else [i, (i + 1) % w.nv])
+            elif kind == 'point':
+                w.add('p', *(w.ref(int(i), w.nv) for i in rng.integers(w.nv, size=int(rng.integers(1, 4)))))
+            elif kind == 'line':
+                w.add('l', *(w.ref(int(i), w.nv) for i in rng.integers(w.nv, size=int(rng.integers(2, 4)))))
+            elif kind == 'vertex':
+                [w.vertex, lambda p: w.texture(), lambda p: w.normal()][int(rng.integers(3))](rng.uniform(-50.0, 50.0, 3))
+            else:
+                w.lines.append(['', '# comment', 'g group', 'o object', 's off', 's 1'][int(rng.integers(6))])
+
+    end = '\r\n' if rng.random() < 0.2 else '\n'
+    with open(file, 'w', newline='') as out:
+        out.write(end.join(w.lines) + end)
+
+def generate_mtl(rng, file, materials):
+    lines = ['# random case']
+    if rng.random() < 0.1: lines.append('Kd 1 0 0')   # before any newmtl, belongs to no material
+    for name in materials:
+        if rng.random() < 0.1: continue     # used in the obj file but missing here
+        lines.append(f"newmtl {name}")
+        for key in ('Ka', 'Kd', 'Ks', 'Ke'):
+            if rng.random() < 0.6: lines.append(f"{key} " + ' '.join(number(rng, x) for x in rng.random(3)))
+        for key in ('Ns', 'Ni', 'd'):
+            if rng.random() < 0.5: lines.append(f"{key} {number(rng, rng.uniform(0.0, 100.0))}")
+        if rng.random() < 0.5: lines.append(f"illum {int(rng.integers(11))}")
+        for key in ('map_Kd', 'map_Ka', 'map_Ks', 'map_Ns', 'map_d'):
+            if rng.random() < 0.2: lines.append(f"{key} {name}_{key}.png")
+        if rng.random() < 0.3: lines.append('')
+        if rng.random() < 0.2: lines.append(f"\t# {name} done")
+    with open(file, 'w') as out:
+        out.write('\n'.join(lines) + '\n')
+
+def generate(seed, directory):  # obj file of one case, with its mtl file next to it
+    rng = np.random.default_rng(seed)
+    materials = [f"material_{i}" for i in range(int(rng.integers(1, 6)))]
+    file = os.path.join(directory, f"case_{seed}.obj")
+    generate_obj(rng, file, materials)
+    generate_mtl(rng, os.path.join(directory, f"case_{seed}.mtl"), materials)
+    return file
+
+#-------------------------------------------------------------------------------------
+
+def resolve(item, count):
+    i = int(item)
+    return i - 1 if i > 0 else count + i
+
+def reference_obj(file):  # snapshot() of the file, parsed the plain way
+    vertex, texture, normal, geometry = [], [], [], []
+    current = {'material': None, 'face': [], 'point': [], 'line': []}
+
+    with open(file) as lines:
+        for line in lines:
+            words = line.split()
+            if not words: continue
+            command, data = words[0], words[1:]
+
+            if command == 'v': vertex.append([float(x) for x in data[:3]])
+            elif command == 'vt': texture.append([float(x) for x in data[:2]] + [0.0])
+            elif command == 'vn': normal.append([float(x) for x in data[:3]])
+            elif command == 'usemtl':
+                if current['material'] is not None or current['face'] or current['point'] or current['line']:
+                    geometry.append(current)
+                current = {'material': data[0] if data else None, 'face': [], 'point': [], 'line': []}
+            elif command == 'p':
+                current['point'].append([resolve(x, len(vertex)) for x in data])
+            elif command == 'l':
+                if len(data) == 2: current['line'].append([resolve(x, len(vertex)) for x in data])
+            elif command == 'f':
+                face = ([], [], [])
+                for corner in data:
+                    parts = corner.split('/')
+                    for k, (items, count) in enumerate(zip(face, (len(vertex), len(texture), len(normal)))):
+                        if len(parts) > k and parts[k]: items.append(resolve(parts[k], count))
+                current['face'].append(face)
+
+    geometry.append(current)
+    return {'vertex': np.array(vertex, dtype=np.float64).reshape(-1, 3),
+            'texture': np.array(texture, dtype=np.float64).reshape(-1, 3),
+            'normal': np.array(normal, dtype=np.float64).reshape(-1, 3),
+            'geometry': geometry}
+
+def snapshot(obj):  # plain data of a parsed obj, to compare with reference_obj
+    return {'vertex': np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3),
+            'texture': np.asarray(obj.texture, dtype=np.float64).reshape(-1, 3),
+            'normal': np.asarray(obj.normal, dtype=np.float64).reshape(-1, 3),
+            'geometry': [{'material': g.material,
+                          'face': [(list(f.vertex), list(f.texture), list(f.normal)) for f in g.face],
+                          'point': [list(p) for p in g.point],
+                          'line': [list(l) for l in g.line]} for g in obj.geometry]}
+
+def difference(expected, actual, error=None):  # first difference as text, or None
+    for name in ('vertex', 'texture', 'normal'):
+        a, b = expected[name], actual[name]
+        if a.shape != b.shape: return f"{name} shape {a.shape} != {b.shape}"
+        bound = 0.0 if error is None else error[name] * (1.0 + tolerance) + tolerance * np.abs(a).max(initial=0.0)
+        if np.any(np.abs(a - b) > bound): return f"{name} values differ by {np.abs(a - b).max():.3g}"
+
+    if len(expected['geometry']) != len(actual['geometry']):
+        return f"geometries {len(expected['geometry'])} != {len(actual['geometry'])}"
+    for g, (a, b) in enumerate(zip(expected['geometry'], actual['geometry'])):
+        for key in ('material', 'face', 'point', 'line'):
+            if a[key] == b[key]: continue
+            if key == 'material': return f"geometry {g} material {a[key]} != {b[key]}"
+            if len(a[key]) != len(b[key]): return f"geometry {g} {key}s {len(a[key])} != {len(b[key])}"
+            i = next(i for i, (x, y) in enumerate(zip(a[key], b[key])) if x != y)
+            return f"geometry {g} {key} {i}: {a[key][i]} != {b[key][i]}"
+    return None
+
+def load(file, precision='float64'):
+    obj = OBJ.WavefrontOBJ()
+    obj.load(file, precision)
+    return obj
+
+def reference_mtl(file):  # list of attribute dicts, parsed the plain way
+    directory = os.path.dirname(file)
+    materials, current = [], vars(Material())
+    with open(file) as lines:
+        for line in lines:
+            words = line.split()
+            if not words: continue
+            command, data = words[0], words[1:]
+            if command == 'newmtl':
+                if current['name'] is not None: materials.append(current)
+                current = vars(Material())
+                current['name'] = data[0]
+            elif command in ('Ka', 'Kd', 'Ks', 'Ke'): current[command] = np.array([float(x) for x in data[:3]])
+            elif command in ('Ns', 'Ni', 'd'): current[command] = float(data[0])
+            elif command == 'illum': current[command] = int(data[0])
+            elif command.startswith('map_') and command in current: current[command] = os.path.join(directory, data[0])
+    materials.append(current)
+    return materials
+
+def same_material(a, b):
+    for key, value in a.items():
+        other = getattr(b, key)
+        if isinstance(value, np.ndarray):
+            if not np.allclose(value, other, rtol=tolerance, atol=0.0): return key
+        elif value != other: return key
+    return None
+
+#-------------------------------------------------------------------------------------
+
+class Check:  # summed times and failures of one comparison
+    def __init__(self, name):
+        self.name = name
+        self.reference = 0.0
+        self.optimized = 0.0
+        self.cases = 0
+        self.failures = []
+
+    def time(self, side, function):
+        start = time.perf_counter()
+        result = function()
+        setattr(self, side, getattr(self, side) + time.perf_counter() - start)
+        return result
+
+    def fail(self, seed, message):
+        self.failures.append((seed, message))
+
+def check_parse(check, seed, file):
+    expected = check.time('reference', lambda: reference_obj(file))
+    obj = check.time('optimized', lambda: load(file))
+    message = difference(expected, snapshot(obj))
+    if message: check.fail(seed, message)
+
+def check_append(check, seed, file):  # the file written in three parts, the last line first without its newline
+    with open(file, 'rb') as buffer:
+        content = buffer.read()
+    full = check.time('reference', lambda: load(file))
+
+    rng = np.random.default_rng(seed)
+    cut = int(rng.integers(len(content)))
+    cut = content.rfind(b'\n', 0, cut) + 1
+    part = os.path.splitext(file)[0] + '.part.obj'
+    with open(part, 'wb') as out:
+        out.write(content[:cut])
+    obj = check.time('optimized', lambda: load(part))
+    offset = cut
+    for end in (len(content) - 1, len(content)):
+        with open(part, 'wb') as out:
+            out.write(content[:end])
+        offset = check.time('optimized', lambda: obj.append(part, offset))
+    os.remove(part)
+
+    if offset != len(content): check.fail(seed, f"append stopped at {offset} of {len(content)} bytes")
+    message = difference(snapshot(full), snapshot(obj))
+    if message: check.fail(seed, message)
+
+def check_buckets(check, seed, file):
+    obj = load(file)
+    for g, geometry in enumerate(obj.geometry):
+        expected = {f: face for f, face in enumerate(geometry.face) if len(face.vertex) >= 3}
+        buckets = check.time('optimized', lambda: OBJ.sort_faces(geometry.face))
+        seen = 0
+        for (size, layout), bucket in buckets.items():
+            for name in ('vertex', 'texture', 'normal'):
+                data = getattr(bucket, name)
+                if data is None: continue
+                rows = bucket.polygons(name) if size == 0 else data
+                for f, row in zip(bucket.face.tolist(), rows):
+                    face = expected.get(f)
+                    if face is None or list(row) != getattr(face, name) or len(face.vertex) != len(row):
+                        check.fail(seed, f"geometry {g} bucket {size} {layout} face {f} {name}")
+                        return
+            seen += len(bucket)
+        if seen != len(expected): check.fail(seed, f"geometry {g} buckets hold {seen} of {len(expected)} faces")
+
+def same_mesh(check, seed, label, expected, mesh):
+    if not np.array_equal(expected.face, mesh.face):
+        check.fail(seed, f"{label} triangle faces differ")
+        return
+    for name in ('position', 'normal', 'texpos'):
+        a, b = getattr(expected, name), getattr(mesh, name)
+        if (a is None) != (b is None) or (a is not None and not np.allclose(a, b, rtol=tolerance, atol=tolerance)):
+            check.fail(seed, f"{label} {name} differs")
+
+def check_compile(check, seed, file):
+    obj = load(file)
+    for g, geometry in enumerate(obj.geometry):
+        expected = check.time('reference', lambda: Compile.compile_faces(obj, geometry))
+        mesh = check.time('optimized', lambda: Compile.compile_geometry(obj, geometry))
+        same_mesh(check, seed, f"geometry {g}", expected, mesh)
+
+def check_geometries(check, seed, file):  # material views against the geometries they join
+    obj = load(file)
+    for material, view in obj.geometries().items():
+        for name in ('face', 'point', 'line'):
+            items = [item for geometry in view.geometries for item in getattr(geometry, name)]
+            chain = getattr(view, name)
+            if (len(chain) != len(items) or list(chain) != items or chain[::2] != items[::2] or chain[::-3] != items[::-3]
+                    or [chain[i] for i in range(-len(items), len(items))] != items + items):
+                check.fail(seed, f"material {material} {name} view differs")
+        expected = check.time('reference', lambda: Compile.compile_faces(obj, view))
+        mesh = check.time('optimized', lambda: Compile.compile_geometry(obj, view))
+        same_mesh(check, seed, f"material {material}", expected, mesh)
+
+def check_precision(check, seed, file):
+    expected = snapshot(check.time('reference', lambda: load(file)))
+    for precision in ('float32', 'quantized16'):
+        obj = check.time('optimized', lambda: load(file, precision))
+        message = difference(expected, snapshot(obj), obj.error)
+        if message: check.fail(seed, f"{precision} {message}")
+
+def check_triangles(check, seed, file):  # Triangulate against the polygon area and corner count
+    obj = load(file)
+    for g, geometry in enumerate(obj.geometry):
+        for f, face in enumerate(geometry.face):
+            if len(face.vertex) < 5: continue
+            corners, normal = check.time('optimized', lambda: Compile.triangulate(obj, face.vertex))
+
+            polygon = obj.vertex[face.vertex]
+            polygon = polygon[np.any(polygon != np.roll(polygon, -1, axis=0), axis=1)]
+            newell = np.cross(polygon, np.roll(polygon, -1, axis=0)).sum(axis=0)
+            area = np.linalg.norm(newell) / 2.0
+            scale = np.linalg.norm(polygon.max(axis=0) - polygon.min(axis=0)) ** 2
+
+            triangle = obj.vertex[np.array(face.vertex)[np.array(corners, dtype=np.int64).reshape(-1, 3)]]
+            cross = np.cross(triangle[:, 1] - triangle[:, 0], triangle[:, 2] - triangle[:, 0])
+            covered = np.abs(cross @ newell).sum() / (2.0 * np.linalg.norm(newell)) if area > 0.0 else 0.0
+
+            if area <= 1e-9 * scale: continue   # collinear, nothing to cover
+            if len(corners) != len(polygon) - 2:
+                check.fail(seed, f"geometry {g} face {f}: {len(corners)} triangles for {len(polygon)} corners")
+            elif abs(covered - area) > 1e-6 * scale:
+                check.fail(seed, f"geometry {g} face {f}: triangles cover {covered:.6g} of area {area:.6g}")
+
+def check_mtl(check, seed, file):
+    file = os.path.splitext(file)[0] + '.mtl'
+    expected = check.time('reference', lambda: reference_mtl(file))
+    mtl = WavefrontMTL()
+    check.time('optimized', lambda: mtl.load(file))
+    if len(expected) != len(mtl.materials):
+        check.fail(seed, f"materials {len(expected)} != {len(mtl.materials)}")
+        return
+    for a, b in zip(expected, mtl.materials):
+        key = same_material(a, b)
+        if key: check.fail(seed, f"material {a['name']} {key}")
+    for name in {g['material'] for g in reference_obj(os.path.splitext(file)[0] + '.obj')['geometry']}:
+        found = next((a for a in expected if a['name'] == name), vars(Material()))
+        key = same_material(found, mtl.material(name))
+        if key: check.fail(seed, f"material({name}) {key}")
+
+def check_raycast(check, seed, file):
+    obj = load(file)
+    bvh = BVH.build(obj)
+    if not len(bvh): return
+    rng = np.random.default_rng(seed)
+    low, high = bvh.triangle.min(axis=(0, 1)), bvh.triangle.max(axis=(0, 1))
+    radius = np.linalg.norm(high - low) + 1.0
+    target = rng.uniform(low, high, (rays, 3))
+    direction = rng.normal(size=(rays, 3))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    origin = target - direction * radius
+
+    hits = check.time('reference', lambda: [bvh.raycast(o, d) for o, d in zip(origin, direction)])
+    distance, _ = check.time('optimized', lambda: bvh.raycast_all(origin, direction))
+    for r, hit in enumerate(hits):
+        expected = np.inf if hit is None else hit.distance
+        if expected == distance[r]: continue
+        if abs(expected - distance[r]) > tolerance * radius:
+            check.fail(seed, f"ray {r}: distance {expected:.9g} != {distance[r]:.9g}")
+            return
+
+checks = {
+    'parse': check_parse,
+    'append': check_append,
+    'buckets': check_buckets,
+    'compile': check_compile,
+    'geometries': check_geometries,
+    'precision': check_precision,
+    'triangles': check_triangles,
+    'mtl': check_mtl,
+    'raycast': check_raycast,
+}
+
+#-------------------------------------------------------------------------------------
+
+def print_check(check):
+    speedup = f"{check.reference / check.optimized:5.1f}x" if check.reference and check.optimized else '     -'
+    reference = f"{check.reference:7.3f} s" if check.reference else '      - s'
+    print(f"differential: {check.name:<10} cases {check.cases} / reference {reference} / "
+          f"optimized {check.optimized:7.3f} s / {speedup} / failures {len(check.failures)}")
+
+def run(cases, seed=0, names=None, directory=None):  # returns a list of failures
+    names = names or list(checks)
+    results = [Check(name) for name in names]
+
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = directory or temporary
+        os.makedirs(directory, exist_ok=True)
+        for case in range(seed, seed + cases):
+            file = generate(case, directory)
+            for check in results:
+                check.cases += 1
+                try:
+                    checks[check.name](check, case, file)
+                except Exception as error:
+                    check.fail(case, f"{type(error).__name__}: {error}")
+
+    failures = []
+    for check in results:
+        print_check(check)
+        failures += [(check.name, case, message) for case, message in check.failures]
+    for name, case, message in failures:
+        print(f"mismatch: {name} / seed {case} / {message}")
+    return failures
+
+#-------------------------------------------------------------------------------------
+
+description = 'Compare the fast obj/mtl parse and compile paths with reference code on random files'
+
+def main():
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-n', '--cases', type=int, default=100, help='Number of random cases')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first case')
+    parser.add_argument('-c', '--check', action='append', choices=list(checks), help='Check to run (default all)')
+    parser.add_argument('--keep', metavar='DIR', help='Write the generated files to DIR and keep them')
+    args = parser.parse_args()
+
+    if run(args.cases, args.seed, args.check, args.keep):
+        sys.exit(1)
+
+if __name__ == "__main__":
+     main()
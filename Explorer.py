@@ -9,19 +9,32 @@
 # This software is released under the MIT License.
 #-------------------------------------------------------------------------------------
 
-import vpythonex as vp                   # import a wrapper to avoid ZeroDivisionError 
-
-import MapTextures as map
-#-------------------------------------------------------------------------------------    
-
-from WavefrontOBJ import *
-from WavefrontMTL import *
-
 import os
 import sys
 import argparse
-import Triangulate
-import numpy as np
+import Profiler as profile
+
+from Lazy import lazy                    # heavy modules are loaded on first use
+from Storage import precisions
+
+vp = lazy('vpythonex')                   # import a wrapper to avoid ZeroDivisionError 
+
+map = lazy('MapTextures')
+#-------------------------------------------------------------------------------------    
+
+OBJ = lazy('WavefrontOBJ')
+MTL = lazy('WavefrontMTL')
+
+Triangulate = lazy('Triangulate')
+Instancing = lazy('Instancing')
+Cache = lazy('Cache')
+BVH = lazy('BVH')
+Tiling = lazy('Tiling')
+LOD = lazy('LOD')
+HiddenFaces = lazy('HiddenFaces')
+Watch = lazy('Watch')
+Server = lazy('Server')
+np = lazy('numpy')
     
 #-------------------------------------------------------------------------------------
 
@@ -30,6 +43,15 @@ sceneHeight = 720          # Adjust the height as needed
 
 loadThisObjFileInDebug = 'c:\\temp\\rubikcube.obj'
 
+tileRange = 2.0            # Show tiles within this many scene ranges of the scene center
+tilesPerUpdate = 4         # Build at most this many new tiles per frame
+
+watchFrames = 15           # Poll watched files every this many frames
+
+serverAddress = ('127.0.0.1', 8765)  # Default host and port of Server.py
+
+updates = []               # Called once per frame after the model is loaded
+
 #-------------------------------------------------------------------------------------
 
 radiusLine = 0.01
@@ -138,15 +160,19 @@ def getcwd_texture(texture):
     return None
 
 def create_points(obj, geometry, material):
-    if geometry.point is None: return
+    if geometry.point is None: return []
+    objects = []
     for point in geometry.point:
         if point is None: continue
         for i in point:
             v = obj.vertex[i]
-            create_point(v, radiusPoint, material.color())
+            objects.append(create_point(v, radiusPoint, material.color()))
+        profile.count('vpython.objects', len(point))
+    return objects
 
 def create_lines(obj, geometry, material):
-    if geometry.line is None: return
+    if geometry.line is None: return []
+    objects = []
     for line in geometry.line:
         if line is None: continue
         size = len(line)
@@ -154,10 +180,13 @@ def create_lines(obj, geometry, material):
         for i in range(size-1):
             v0 = obj.vertex[line[i]]
             v1 = obj.vertex[line[i + 1]]
-            create_line(v0, v1, radiusLine, material.color())
+            objects.extend(create_line(v0, v1, radiusLine, material.color()))
+        profile.count('vpython.objects', 2 * (size - 1))
+    return objects
 
 def create_wire_faces(obj, geometry, material):
-    if geometry.face is None: return
+    if geometry.face is None: return []
+    objects = []
     for face in geometry.face:
         if face is None: continue
         size = len(face.vertex)
@@ -166,7 +195,38 @@ def create_wire_faces(obj, geometry, material):
         for i in face.vertex:
             v = obj.vertex[i]
             face_vertex.append(v)
-        create_wire_face(face_vertex, radiusLine, np.array([0.5, 0.5, 0.5]))
+        objects.append(create_wire_face(face_vertex, radiusLine, np.array([0.5, 0.5, 0.5])))
+        profile.count('vpython.objects')
+    return objects
+
+creators = {(3, False, False): create_triangle,          # (size, normals, texture) -> create function
+            (3, True, False): create_triangle_normal,
+            (3, False, True): create_triangle_texture,
+            (3, True, True): create_triangle_normal_texture,
+            (4, False, False): create_quad,
+            (4, True, False): create_quad_normal,
+            (4, False, True): create_quad_texture,
+            (4, True, True): create_quad_normal_texture}
+
+def create_polygons(obj, bucket, color):
+    objects = []
+    for vertex in bucket.polygons():
+        polygon = []
+        for i, p in zip(vertex.tolist(), obj.vertex[vertex]):
+            v = Triangulate.Point(p[0], p[1], p[2], i)
+            polygon.append(v)
+
+        with profile.stage('triangulate'):
+            triangulated, normal = Triangulate.triangulate(polygon)
+
+        n = np.array([normal.x, normal.y, normal.z])
+
+        for t in triangulated:
+            v0 = np.array([t.p0.x, t.p0.y, t.p0.z])
+            v1 = np.array([t.p1.x, t.p1.y, t.p1.z])
+            v2 = np.array([t.p2.x, t.p2.y, t.p2.z])
+            objects.append(create_triangle_normal(v0, v1, v2, n, n, n, color))
+    return objects
 
 def create_faces(obj, geometry, material):
     if geometry.face is None: return
@@ -175,106 +235,207 @@ def create_faces(obj, geometry, material):
     texture = material.texture()
     texture = getcwd_texture(texture)
 
-    for face in geometry.face:
-        if face is None: continue
-        size = len(face.vertex)
-        if size < 2: continue
+    objects = []
+    counts = {3: 0, 4: 0, 0: 0}
 
-        if size == 3:
-            v0 = obj.vertex[face.vertex[0]]
-            v1 = obj.vertex[face.vertex[1]]
-            v2 = obj.vertex[face.vertex[2]]
-
-            if len(face.normal) == 3:
-                n0 = obj.normal[face.normal[0]]
-                n1 = obj.normal[face.normal[1]]
-                n2 = obj.normal[face.normal[2]]
-                if len(face.texture) == 3 and texture is not None:
-                    t0 = obj.texture[face.texture[0]]
-                    t1 = obj.texture[face.texture[1]]
-                    t2 = obj.texture[face.texture[2]]
-                    create_triangle_normal_texture(v0, v1, v2, n0, n1, n2, t0, t1, t2, texture)
-                else:
-                    create_triangle_normal(v0, v1, v2, n0, n1, n2, color)
-            else:
-                if len(face.texture) == 3 and texture is not None:
-                    t0 = obj.texture[face.texture[0]]
-                    t1 = obj.texture[face.texture[1]]
-                    t2 = obj.texture[face.texture[2]]
-                    create_triangle_texture(v0, v1, v2, t0, t1, t2, texture)
-                else:
-                    create_triangle(v0, v1, v2, color)
+    for (size, layout), bucket in geometry.buckets().items():
+        counts[size] += len(bucket)
 
+        if size == 0:
+            objects += create_polygons(obj, bucket, color)
             continue
 
-        if size == 4:
-            v0 = obj.vertex[face.vertex[0]]
-            v1 = obj.vertex[face.vertex[1]]
-            v2 = obj.vertex[face.vertex[2]]
-            v3 = obj.vertex[face.vertex[3]]
-
-            if len(face.normal) == 4:
-                n0 = obj.normal[face.normal[0]]
-                n1 = obj.normal[face.normal[1]]
-                n2 = obj.normal[face.normal[2]]
-                n3 = obj.normal[face.normal[3]]
-                if len(face.texture) == 4 and texture is not None:
-                    t0 = obj.texture[face.texture[0]]
-                    t1 = obj.texture[face.texture[1]]
-                    t2 = obj.texture[face.texture[2]]
-                    t3 = obj.texture[face.texture[3]]
-                    create_quad_normal_texture(v0, v1, v2, v3, n0, n1, n2, n3, t0, t1, t2, t3, texture)
-                else:
-                    create_quad_normal(v0, v1, v2, v3, n0, n1, n2, n3, color)
-            else:
-                if len(face.texture) == 4 and texture is not None:
-                    t0 = obj.texture[face.texture[0]]
-                    t1 = obj.texture[face.texture[1]]
-                    t2 = obj.texture[face.texture[2]]
-                    t3 = obj.texture[face.texture[3]]
-                    create_quad_texture(v0, v1, v2, v3, t0, t1, t2, t3, texture)
-                else:
-                    create_quad(v0, v1, v2, v3, color)
+        corners = [obj.vertex[bucket.vertex.reshape(-1)]]     # every attribute gathered once per bucket
+        normals = bucket.normal is not None
+        textured = bucket.texture is not None and texture is not None
+        if normals: corners.append(obj.normal[bucket.normal.reshape(-1)])
+        if textured: corners.append(obj.texture[bucket.texture.reshape(-1)])
 
-            continue
+        rows = np.concatenate([np.asarray(c).reshape(len(bucket), size, 3) for c in corners], axis=1)
+        create = creators[(size, normals, textured)]
+        last = texture if textured else color
+        objects.extend(create(*row, last) for row in rows)
 
-        polygon = []
-        for i in face.vertex:
-            p = obj.vertex[i]
-            v = Triangulate.Point(p[0], p[1], p[2], i)
-            polygon.append(v)
+    profile.count('faces.3', counts[3])
+    profile.count('faces.4', counts[4])
+    profile.count('faces.n', counts[0])
+    profile.count('ngons.triangulated', counts[0])
+    profile.count('vpython.objects', len(objects))
 
-        triangles, normal = Triangulate.triangulate(polygon)
-
-        n = np.array([normal.x, normal.y, normal.z])
-
-        for t in triangles:
-            v0 = np.array([t.p0.x, t.p0.y, t.p0.z])
-            v1 = np.array([t.p1.x, t.p1.y, t.p1.z])
-            v2 = np.array([t.p2.x, t.p2.y, t.p2.z])
-            create_triangle_normal(v0, v1, v2, n, n, n, color)
+    return objects
 
 def create_geometry(obj, mtl, geometry, wireframe):
-    if geometry is None: return
+    if geometry is None: return []
     material = mtl.material(geometry.material)
-    create_points(obj, geometry, material)
-    create_lines(obj, geometry, material)
+    objects = create_points(obj, geometry, material)
+    objects += create_lines(obj, geometry, material)
     
     if wireframe:
-        create_wire_faces(obj, geometry, material)
+        objects += create_wire_faces(obj, geometry, material)
     else:
-        create_faces(obj, geometry, material)
+        objects += create_faces(obj, geometry, material) or []
+
+    return objects
+
+def subset_geometry(geometry, faces):
+    subset = OBJ.Geometry()
+    subset.material = geometry.material
+    subset.face = [geometry.face[i] for i in faces]
+    return subset
+
+def create_instances(obj, mtl, groups):
+    for group in groups:
+        reference = group.reference()
+        geometry = obj.geometry[reference.geometry]
+        material = mtl.material(geometry.material)
+        objects = create_faces(obj, subset_geometry(geometry, reference.faces), material)
+        if not objects: continue
+        part = vp.compound(objects, origin=vector(reference.center))
+        length = part.axis.mag
+        for clone in group.clones():
+            rotation = clone.rotation(reference)
+            axis = vector(rotation[:, 0]) * length
+            up = vector(rotation[:, 1])
+            part.clone(pos=vector(clone.center), axis=axis, up=up)
+        profile.count('vpython.compounds')
+        profile.count('vpython.clones', len(group.clones()))
+
+def explore_instances(obj, mtl):
+    if obj is None: return
+    if mtl is None: return
+
+    with profile.stage('instancing'):
+        groups = Instancing.instances(obj)
+    Instancing.report(groups)
+
+    repeated = [group for group in groups if len(group.parts) > 1]
+    create_instances(obj, mtl, repeated)
+
+    instanced = [set() for _ in obj.geometry]
+    for group in repeated:
+        for part in group.parts:
+            instanced[part.geometry].update(part.faces)
+
+    for g, geometry in enumerate(obj.geometry):
+        material = mtl.material(geometry.material)
+        create_points(obj, geometry, material)
+        create_lines(obj, geometry, material)
+        faces = [i for i in range(len(geometry.face)) if i not in instanced[g]]
+        create_faces(obj, subset_geometry(geometry, faces), material)
 
 def explore_geometry(obj, mtl, wireframe):
     if obj is None: return
     if mtl is None: return
     count = 0
     size = len(obj.geometry)
+    parts = []
     for geometry in obj.geometry:
         count+=1
         print(f"geometry: {count} / {size} / faces : {len(geometry.face)}")
-        create_geometry(obj, mtl, geometry, wireframe)
+        parts.append(create_geometry(obj, mtl, geometry, wireframe))
+    return parts
         
+def create_mesh(mesh, material, center):  # triangles from compiled arrays (see Compile.py)
+    color = material.color()
+    texture = getcwd_texture(material.texture())
+    objects = []
+    for t in range(len(mesh)):
+        v0, v1, v2 = mesh.position[t] - center
+        n0, n1, n2 = mesh.normal[t]
+        if mesh.texpos is not None and texture is not None:
+            t0, t1, t2 = mesh.texpos[t]
+            objects.append(create_triangle_normal_texture(v0, v1, v2, n0, n1, n2, t0, t1, t2, texture))
+        else:
+            objects.append(create_triangle_normal(v0, v1, v2, n0, n1, n2, color))
+    profile.count('vpython.objects', len(objects))
+    return objects
+
+def explore_meshes(model, mtl, center):
+    size = len(model.meshes)
+    for count, mesh in enumerate(model.meshes, 1):
+        print(f"mesh: {count} / {size} / triangles : {len(mesh)}")
+        create_mesh(mesh, mtl.material(mesh.material), center)
+
+def load_served(file, box, precision, server):  # compiled arrays from Server.py instead of parsing
+
+    host, port = server
+    with profile.stage('server'):
+        model = Server.fetch(file, precision, host, port)
+    if model is None: return False
+
+    mtl = MTL.WavefrontMTL()
+    with profile.stage('mtl'):
+        mtl.load(model.mtllib)
+
+    with profile.stage('aabb'):
+        position = [mesh.position.reshape(-1, 3) for mesh in model.meshes if len(mesh)]
+        low = np.min([p.min(axis=0) for p in position], axis=0) if position else np.zeros(3)
+        high = np.max([p.max(axis=0) for p in position], axis=0) if position else np.zeros(3)
+        center, size = (low + high) / 2, high - low
+
+    setRadiusLinePoint(size)
+
+    position_camera(np.array([0,0,0]), size, 0.4, 1.5, box)
+
+    set_light_behind_camera()
+
+    with profile.stage('textures'):
+        map.setupVPythonTextureFiles(mtl)
+
+    with profile.stage('scene'):
+        explore_meshes(model, mtl, center)
+
+    return True
+
+def create_level(level, obj, mtl):  # one compound per geometry from simplified triangles
+    parts = []
+    normals = level.normals()
+    order = np.argsort(level.geometry, kind='stable')
+    groups = np.split(order, np.cumsum(np.bincount(level.geometry, minlength=len(obj.geometry)))[:-1])
+    for geometry, triangles in zip(obj.geometry, groups):
+        color = mtl.material(geometry.material).color()
+        objects = []
+        for t in triangles.tolist():
+            v0, v1, v2 = level.vertex[level.index[t]]
+            n = normals[t]
+            objects.append(create_triangle_normal(v0, v1, v2, n, n, n, color))
+        profile.count('vpython.objects', len(objects))
+        if objects: parts.append(vp.compound(objects))
+    return parts
+
+def explore_lod(obj, mtl):
+    if obj is None: return
+    if mtl is None: return
+
+    with profile.stage('lod'):
+        levels = LOD.levels(obj)
+    LOD.report(levels)
+
+    parts = [[] for _ in levels]
+    for geometry in obj.geometry:
+        material = mtl.material(geometry.material)
+        create_points(obj, geometry, material)
+        create_lines(obj, geometry, material)
+        objects = create_faces(obj, geometry, material)
+        if objects: parts[0].append(vp.compound(objects))
+
+    for i in range(1, len(levels)):
+        parts[i] = create_level(levels[i], obj, mtl)
+        for part in parts[i]: part.visible = False
+    profile.count('vpython.compounds', sum(len(level) for level in parts))
+
+    shown = [0]
+
+    def update():
+        distance = (vp.scene.camera.pos - vp.scene.center).mag
+        level = LOD.select(levels, distance, vp.scene.range, vp.scene.fov, sceneHeight)
+        if level == shown[0]: return
+        for part in parts[level]: part.visible = True
+        for part in parts[shown[0]]: part.visible = False
+        shown[0] = level
+
+    updates.append(update)
+
 def create_box(center, size, color):
     if center is None: return
     size /= 2
@@ -316,16 +477,256 @@ def set_light_behind_camera():
 
 #-------------------------------------------------------------------------------------
 
-def load(file, box, wireframe):
+def enable_picking(obj, file, precision, cache):
+    with profile.stage('bvh'):
+        bvh = BVH.cached(obj, file, precision) if cache else BVH.build(obj)
+
+    marker = vp.label(visible=False, height=12, box=True, opacity=0.8)
+
+    def click(event):
+        origin = vp.scene.camera.pos
+        ray = vp.scene.mouse.ray
+        hit = bvh.raycast([origin.x, origin.y, origin.z], [ray.x, ray.y, ray.z])
+        if hit is None:
+            marker.visible = False
+            return
+        material = obj.geometry[hit.geometry].material
+        text = f"material: {material}\ngeometry: {hit.geometry}\nface: {hit.face}"
+        print(f"pick: material {material} / geometry {hit.geometry} / face {hit.face} / distance {hit.distance:.3f}")
+        marker.pos = vector(hit.point)
+        marker.text = text
+        marker.visible = True
+
+    vp.scene.bind('click', click)
+
+def create_tile(tileset, mtl, data):
+    objects = []
+    vertex = data['vertex'].astype(np.float64)
+    for corners, n, g in zip(data['index'], data['normal'], data['geometry']):
+        color = mtl.material(tileset.materials[g]).color()
+        v0, v1, v2 = vertex[corners]
+        objects.append(create_triangle_normal(v0, v1, v2, n, n, n, color))
+    profile.count('vpython.objects', len(objects))
+    if not objects: return None
+    part = vp.compound(objects)
+    delete(objects)     # compound only hides the objects it was made of
+    return part
+
+def explore_tiles(tileset, mtl, budget):
+    shown = {}
+
+    def evicted(tile, data, part):
+        shown.pop(tile.id, None)
+        if part is None: return
+        delete([part])  # built again when the tile is needed again
+        profile.count('tiles.evicted')
+
+    cache = Tiling.TileCache(tileset, budget, evicted)
+    last = [None]
+
+    def update():
+        center = vp.scene.center
+        eye = vp.scene.camera.pos
+        view = (center.x, center.y, center.z, eye.x, eye.y, eye.z, vp.scene.range)
+        if view == last[0]: return
+
+        wanted = tileset.around(view[0:3], vp.scene.range * tileRange, view[3:6])
+
+        built = 0
+        for tile in wanted:
+            if cache.payload(tile) is None:
+                if built == tilesPerUpdate: break
+                cache.attach(tile, create_tile(tileset, mtl, cache.get(tile)))
+                built += 1
+            else:
+                cache.get(tile)  # keep it recently used
+            part = cache.payload(tile)
+            if part is not None: part.visible = True
+            shown[tile.id] = part
+        else:
+            last[0] = view  # everything wanted is shown, wait for the camera to move
+
+        visible = {tile.id for tile in wanted}
+        for id in [id for id in shown if id not in visible]:
+            part = shown.pop(id)
+            if part is not None: part.visible = False
+
+    return update
+
+def load_tiles(file, directory, box, precision, cache, budget):
+
+    if not Tiling.exists(directory, file):
+        if Tiling.exists(directory):
+            print(f"tiles: {directory} was built from another model or an older version of it, building again")
+        with profile.stage('obj'):
+            obj = load_obj(file, precision, cache)
+        with profile.stage('tiling'):
+            Tiling.build(obj, directory, file=file)
+        del obj
+
+    tileset = Tiling.TileSet(directory)
+    print(f"tiles: {len(tileset.tiles)} / triangles : {sum(tile.triangles for tile in tileset.tiles)}")
+
+    mtl = MTL.WavefrontMTL()
+    with profile.stage('mtl'):
+        mtl.load(tileset.mtllib)
+
+    center = np.array([0,0,0])
+    size = tileset.high - tileset.low
+
+    setRadiusLinePoint(size)
+
+    position_camera(center, size, 0.4, 1.5, box)
+
+    set_light_behind_camera()
+
+    update = explore_tiles(tileset, mtl, budget)
+    with profile.stage('scene'):
+        update()
+    updates.append(update)
+
+def weld(obj, tolerance):
+    report = obj.weld(tolerance)
+    for key in ('vertex', 'texture', 'normal'):
+        print(f"weld: {key} {report[key][0]} -> {report[key][1]}")
+    before, after = report['memory']
+    print(f"weld: memory {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB")
+
+def delete(objects):  # remove from the browser and drop VPython's references, hidden objects stay in both
+    registry = vp.baseObj.object_registry
+    for o in objects:
+        vertices = list(o.vs) if isinstance(o, vp.triangle) else []   # quads too
+        o.delete()
+        for v in vertices: v.incrementTriangleCount()   # delete() ran __del__, it runs again when collected
+        for item in [o] + vertices:
+            if item is not o: item.delete()
+            registry.pop(item.idx, None)
+            item.canvas.objz(item, 'delete')
+
+def watch_file(file, obj, mtl, parts, wireframe, translation, state, parse, incremental):
+    source = Watch.Source(file)
+    source.parsed(obj, state)
+    scene = {'obj': obj, 'mtl': mtl, 'parts': parts, 'digests': Watch.digests(obj)}
+    frame = [0]
+
+    def build(obj, g):
+        return create_geometry(obj, scene['mtl'], obj.geometry[g], wireframe)
+
+    def append():  # parse the new lines, rebuild the last geometry and build the new ones
+        obj, parts = scene['obj'], scene['parts']
+        first = len(obj.geometry) - 1
+        count = len(obj.vertex)
+        source.appended(obj.append(file, source.offset))
+        obj.vertex[count:] += translation
+        delete(parts.pop())
+        for g in range(first, len(obj.geometry)):
+            parts.append(build(obj, g))
+        scene['digests'] = scene['digests'][:first] + [Watch.digest(obj, g) for g in obj.geometry[first:]]
+        return len(obj.geometry) - first
+
+    def reload():  # parse again and keep the geometries with an unchanged content hash
+        state = Watch.stat(file)
+        obj = parse()
+        digests = Watch.digests(obj)
+        kept = {}
+        for digest, part in zip(scene['digests'], scene['parts']):
+            kept.setdefault(digest, []).append(part)
+        parts, rebuilt = [], 0
+        for g, digest in enumerate(digests):
+            if kept.get(digest):
+                parts.append(kept[digest].pop())
+            else:
+                parts.append(build(obj, g))
+                rebuilt += 1
+        for left in kept.values():
+            for part in left: delete(part)
+        scene.update(obj=obj, parts=parts, digests=digests)
+        source.parsed(obj, state)
+        return rebuilt
+
+    def materials():  # colors and textures can change everything
+        obj = scene['obj']
+        mtl = MTL.WavefrontMTL()
+        mtl.load(obj.mtllib)
+        map.setupVPythonTextureFiles(mtl)
+        scene['mtl'] = mtl
+        for part in scene['parts']: delete(part)
+        scene['parts'] = [build(obj, g) for g in range(len(obj.geometry))]
+        source.watch_materials(obj)
+        return len(obj.geometry)
+
+    def update():
+        frame[0] += 1
+        if frame[0] % watchFrames: return
+        change = source.poll()
+        if change is None: return
+        if change == 'append' and not (incremental and isinstance(scene['obj'].vertex, np.ndarray)):
+            change = 'reload'
+        mtllib = scene['obj'].mtllib
+        state = Watch.stat(file)
+        with profile.stage('watch'):
+            try:
+                if change == 'append': rebuilt = append()
+                elif change == 'reload': rebuilt = reload()
+                else: rebuilt = materials()
+                if change != 'materials' and scene['obj'].mtllib != mtllib:
+                    rebuilt = materials()
+            except (ValueError, IndexError, OSError) as error:  # most likely still being written
+                print(f"watch: {change} failed, keeping the current scene ({type(error).__name__}: {error})")
+                source.failed(state)
+                return
+        print(f"watch: {change} / rebuilt {rebuilt} of {len(scene['obj'].geometry)} geometries")
+
+    updates.append(update)
+
+def cull_hidden(obj, samples):
+    report = HiddenFaces.cull(obj, samples)
+    print(f"hidden: coincident {report['coincident']} / occluded {report['occluded']} / faces {report['faces']} -> {report['after']}")
+    profile.count('faces.hidden', report['faces'] - report['after'])
+
+def load_obj(file, precision, cache):
+    if cache: return Cache.load_obj(file, precision)
+    obj = OBJ.WavefrontOBJ()
+    obj.load(file, precision)
+    return obj
+
+def prepare(obj, precision, tolerance, cull, samples):
+    if precision != 'float64':
+        for key, error in obj.error.items():
+            print(f"{precision}: {key} max error {np.max(error):.3g}")
+
+    if tolerance is not None:
+        with profile.stage('weld'):
+            weld(obj, tolerance)
+
+    if cull:
+        with profile.stage('hidden'):
+            cull_hidden(obj, samples)
+
+def load(file, box, wireframe, instancing, tolerance, precision, cache=False, pick=False, tiles=None, budget=256, lod=False, cull=False, samples=0, watch=False, server=None):
+
+    if tiles:
+        load_tiles(file, tiles, box, precision, cache, budget * 2**20)
+        return
+
+    if server and load_served(file, box, precision, server):
+        return
+
+    state = Watch.stat(file) if watch else None
+
+    with profile.stage('obj'):
+        obj = load_obj(file, precision, cache)
 
-    obj = WavefrontOBJ()
-    obj.load(file)
+    prepare(obj, precision, tolerance, cull, samples)
 
-    mtl = WavefrontMTL()
-    mtl.load(obj.mtllib)
+    mtl = MTL.WavefrontMTL()
+    with profile.stage('mtl'):
+        mtl.load(obj.mtllib)
 
-    center, size = obj.aabb()
-    obj.translate(-center)
+    with profile.stage('aabb'):
+        center, size = obj.aabb()
+        obj.translate(-center)
+    translation = -center
     center = np.array([0,0,0])
     
     setRadiusLinePoint(size)
@@ -334,34 +735,117 @@ def load(file, box, wireframe):
     
     set_light_behind_camera()
     
-    map.setupVPythonTextureFiles(mtl)
+    with profile.stage('textures'):
+        map.setupVPythonTextureFiles(mtl)
     
-    explore_geometry(obj, mtl, wireframe)
+    with profile.stage('scene'):
+        if instancing and not wireframe and not watch:
+            explore_instances(obj, mtl)
+        elif lod and not wireframe and not watch:
+            explore_lod(obj, mtl)
+        else:
+            parts = explore_geometry(obj, mtl, wireframe)
+
+    if pick:
+        enable_picking(obj, file, precision, cache)
+
+    if watch:
+        def parse():
+            obj = OBJ.WavefrontOBJ()
+            obj.load(file, precision)
+            prepare(obj, precision, tolerance, cull, samples)
+            obj.translate(translation)
+            return obj
+
+        incremental = tolerance is None and not cull
+        watch_file(file, obj, mtl, parts, wireframe, translation, state, parse, incremental)
 
 #-------------------------------------------------------------------------------------
 
-def load_Wavefront(file, boundingbox, wireframe):
+def load_Wavefront(file, boundingbox, wireframe, instancing, tolerance, precision, report=None, cprofile=None, trace=False, cache=False, pick=False, tiles=None, budget=256, lod=False, cull=False, samples=0, watch=False, server=None):
     
+    if report or cprofile or trace: profile.enable(trace=trace)
+
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
     vp.scene.visible = False
     vp.scene.width = sceneWidth
     vp.scene.height = sceneHeight
     vp.scene.background = vp.vector(1,1,1)
-    load(file, boundingbox, wireframe)
-    vp.scene.waitfor("textures")
+    with profile.stage('total'):
+        load(file, boundingbox, wireframe, instancing, tolerance, precision, cache, pick, tiles, budget, lod, cull, samples, watch, server)
+        vp.scene.waitfor("textures")
     vp.scene.visible = True
 
-    while True: vp.rate(30)
+    if cprofile:
+        profiler.disable()
+        profiler.dump_stats(cprofile)
+
+    if report:
+        profile.write(report, file=os.path.abspath(file), size=os.path.getsize(file))
+
+    if profile.enabled:
+        profile.show()
+
+    while True:
+        vp.rate(30)
+        for update in updates: update()
         
 #-------------------------------------------------------------------------------------
 
 description = 'Load and visualize 3D objects from Wavefront .obj file'
 
+def inspect(file, json):
+    import Inspect
+    profile.enable()
+    report = Inspect.inspect(file)
+    timings = profile.report()['stages']
+    if json:
+        import json as serializer
+        data = report.data()
+        data['timings'] = timings
+        serializer.dump(data, sys.stdout, indent=2)
+        print()
+    else:
+        Inspect.print_report(report, timings)
+
+def weld_tolerance(text):
+    value = float(text)
+    if not value >= 0.0: raise argparse.ArgumentTypeError(f"must be 0 or more: {text}")
+    return value
+
+def server_address(text):  # (host, port) of HOST[:PORT], the default port when it is left out
+    host, colon, port = text.rpartition(':')
+    if not colon: return text or serverAddress[0], serverAddress[1]
+    if not port.isdigit(): raise argparse.ArgumentTypeError(f"invalid port in '{text}'")
+    return host or serverAddress[0], int(port)
+
 def main():
     
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('filename', help='The name of the file to check')
     parser.add_argument('-b', '--boundingbox', action='store_true', help='Show bounding box')
     parser.add_argument('-w', '--wireframe', action='store_true', help='Show wireframe')
+    parser.add_argument('-i', '--instancing', action='store_true', help='Build repeated parts once and clone them')
+    parser.add_argument('--lod', action='store_true', help='Switch to simplified levels of detail when zoomed out (see LOD.py)')
+    parser.add_argument('--cull-hidden', action='store_true', help='Remove back to back coincident faces before building the scene (see HiddenFaces.py)')
+    parser.add_argument('--visibility-samples', type=int, default=0, metavar='N', help='With --cull-hidden, also remove faces not visible from N directions around the model')
+    parser.add_argument('--watch', action='store_true', help='Reload the model when the obj, mtl or texture files change and rebuild only changed geometries')
+    parser.add_argument('--server', type=server_address, nargs='?', const=serverAddress, metavar='HOST[:PORT]', help='Get the compiled model from a running Server.py instead of parsing it')
+    parser.add_argument('--pick', action='store_true', help='Click on the model to show material, geometry and face')
+    parser.add_argument('--tiles', metavar='DIR', help='Load spatial tiles around the camera on demand (built from the file if DIR has none, see Tiling.py)')
+    parser.add_argument('--tile-memory', type=float, default=256, metavar='MB', help='Memory budget for loaded tiles')
+    parser.add_argument('--inspect', action='store_true', help='Only check the file (headless, see Inspect.py)')
+    parser.add_argument('--json', action='store_true', help='Print the --inspect report as json')
+    parser.add_argument('-c', '--cache', action='store_true', help='Use the parse cache (see Cache.py)')
+    parser.add_argument('-p', '--precision', default='float64', choices=precisions, help='Storage precision of vertices, texture coordinates and normals (float64, float32 or quantized16)')
+    parser.add_argument('--profile', metavar='REPORT', help='Write per-stage timings and counters to a json file')
+    parser.add_argument('--cprofile', metavar='FILE', help='Write a cProfile dump of the load')
+    parser.add_argument('--profile-memory', action='store_true', help='Track peak and retained memory per stage (tracemalloc)')
+    parser.add_argument('--weld', type=weld_tolerance, nargs='?', const=1e-6, default=None, metavar='TOLERANCE', help='Merge vertices closer than tolerance (0 for equal positions only) and drop unused vertex data')
     
     if 'pydevd' in sys.modules:
         args = parser.parse_args([loadThisObjFileInDebug, '-b'])
@@ -372,12 +856,19 @@ def main():
         print(f"Error: The file {args.filename} does not exist.")
         return
 
+    if args.watch and (args.server or args.tiles):
+        parser.error("argument --watch: not allowed with --server or --tiles")
+
     _, ext = os.path.splitext(args.filename)
     if ext.lower() != '.obj':
         print("Error: The file is not a wavefront .obj file.")
         return
 
-    load_Wavefront(args.filename, args.boundingbox, args.wireframe)
+    if args.inspect:
+        inspect(args.filename, args.json)
+        return
+
+    load_Wavefront(args.filename, args.boundingbox, args.wireframe, args.instancing, args.weld, args.precision, args.profile, args.cprofile, args.profile_memory, args.cache, args.pick, args.tiles, args.tile_memory, args.lod, args.cull_hidden, args.visibility_samples, args.watch, args.server)
 
 if __name__ == "__main__":
      main()
@@ -0,0 +1,169 @@
+# Export.py - Python script for writing parsed wavefront obj models to binary mesh formats
+#
+# Writes binary little-endian PLY, binary STL and a minimal glTF binary
+# (.glb) straight from the vertex array and the triangle index arrays.
+# Every file is assembled with numpy structured arrays and written with a
+# few bulk writes, there is no per-vertex Python loop. Quads are split
+# and n-gons are triangulated the same way as in Compile.py. A model
+# without triangles is refused for glb, a glTF mesh needs a primitive.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import json
+import struct
+import numpy as np
+
+import Compile
+
+#-------------------------------------------------------------------------------------
+
+def positions(obj):
+    return np.asarray(obj.vertex, dtype=np.float32).reshape(-1, 3)
+
+#-------------------------------------------------------------------------------------
+
+plyFace = np.dtype([('count', 'u1'), ('index', '<i4', 3)])
+
+def write_ply(obj, file):
+    vertex = positions(obj)
+    index, _ = Compile.triangles(obj)
+
+    face = np.empty(len(index), dtype=plyFace)
+    face['count'] = 3
+    face['index'] = index
+
+    header = ("ply\n"
+              "format binary_little_endian 1.0\n"
+              f"element vertex {len(vertex)}\n"
+              "property float x\n"
+              "property float y\n"
+              "property float z\n"
+              f"element face {len(face)}\n"
+              "property list uchar int vertex_indices\n"
+              "end_header\n")
+
+    with open(file, 'wb') as out:
+        out.write(header.encode('ascii'))
+        out.write(vertex.astype('<f4').tobytes())
+        out.write(face.tobytes())
+
+def read_ply(file):  # reads the files written by write_ply
+    with open(file, 'rb') as buffer:
+        counts = {}
+        while True:
+            line = buffer.readline().decode('ascii').strip()
+            if line.startswith('element'):
+                _, name, count = line.split()
+                counts[name] = int(count)
+            if line == 'end_header': break
+        vertex = np.fromfile(buffer, dtype='<f4', count=counts['vertex'] * 3).reshape(-1, 3)
+        face = np.fromfile(buffer, dtype=plyFace, count=counts['face'])
+    return vertex, face['index']
+
+#-------------------------------------------------------------------------------------
+
+stlTriangle = np.dtype([('normal', '<f4', 3), ('vertex', '<f4', (3, 3)), ('attribute', '<u2')])
+
+def write_stl(obj, file):
+    vertex = positions(obj)
+    index, _ = Compile.triangles(obj)
+
+    triangle = np.zeros(len(index), dtype=stlTriangle)
+    triangle['vertex'] = vertex[index]
+    triangle['normal'] = Compile.flat_normals(triangle['vertex'].astype(np.float64))
+
+    with open(file, 'wb') as out:
+        out.write(b'pyOBJExplorer binary stl'.ljust(80, b' '))
+        out.write(struct.pack('<I', len(triangle)))
+        out.write(triangle.tobytes())
+
+#-------------------------------------------------------------------------------------
+
+def pad(data, fill=b'\0'):
+    return data + fill * (-len(data) % 4)
+
+def write_glb(obj, file, mtl=None):
+    vertex = positions(obj)
+    index, geometry = Compile.triangles(obj)
+    if not len(index):
+        raise ValueError("glb needs at least one triangle, the model has none")   # a mesh without primitives is not valid glTF
+
+    order = np.argsort(geometry, kind='stable')
+    index = index[order].astype('<u4')
+    geometry = geometry[order]
+
+    position = pad(vertex.astype('<f4').tobytes())
+    indices = index.tobytes()
+
+    low = vertex.min(axis=0).tolist() if len(vertex) else [0.0, 0.0, 0.0]
+    high = vertex.max(axis=0).tolist() if len(vertex) else [0.0, 0.0, 0.0]
+
+    views = [{'buffer': 0, 'byteOffset': 0, 'byteLength': len(vertex) * 12, 'target': 34962},
+             {'buffer': 0, 'byteOffset': len(position), 'byteLength': len(indices), 'target': 34963}]
+
+    accessors = [{'bufferView': 0, 'componentType': 5126, 'count': len(vertex), 'type': 'VEC3', 'min': low, 'max': high}]
+
+    primitives = []
+    materials = []
+    names = {}
+
+    start = np.searchsorted(geometry, np.arange(len(obj.geometry)), side='left')
+    end = np.searchsorted(geometry, np.arange(len(obj.geometry)), side='right')
+
+    for g, (a, b) in enumerate(zip(start.tolist(), end.tolist())):
+        if a == b: continue
+        accessors.append({'bufferView': 1, 'byteOffset': a * 12, 'componentType': 5125, 'count': (b - a) * 3, 'type': 'SCALAR'})
+        primitive = {'attributes': {'POSITION': 0}, 'indices': len(accessors) - 1}
+
+        name = obj.geometry[g].material
+        if name not in names:
+            color = mtl.material(name).color() if mtl is not None else [0.5, 0.5, 0.5]
+            names[name] = len(materials)
+            materials.append({'name': str(name), 'pbrMetallicRoughness': {
+                'baseColorFactor': [float(c) for c in color[:3]] + [1.0], 'metallicFactor': 0.0}})
+        primitive['material'] = names[name]
+        primitives.append(primitive)
+
+    gltf = {'asset': {'version': '2.0', 'generator': 'pyOBJExplorer'},
+            'scene': 0,
+            'scenes': [{'nodes': [0]}],
+            'nodes': [{'mesh': 0}],
+            'meshes': [{'primitives': primitives}],
+            'materials': materials,
+            'accessors': accessors,
+            'bufferViews': views,
+            'buffers': [{'byteLength': len(position) + len(pad(indices))}]}
+
+    content = pad(json.dumps(gltf, separators=(',', ':')).encode(), b' ')
+    binary = position + pad(indices)
+
+    with open(file, 'wb') as out:
+        out.write(struct.pack('<III', 0x46546C67, 2, 12 + 8 + len(content) + 8 + len(binary)))
+        out.write(struct.pack('<II', len(content), 0x4E4F534A))
+        out.write(content)
+        out.write(struct.pack('<II', len(binary), 0x004E4942))
+        out.write(binary)
+
+#-------------------------------------------------------------------------------------
+
+def write_obj(obj, file):  # text obj of the triangulated model, for round trip comparisons
+    vertex = positions(obj)
+    index, _ = Compile.triangles(obj)
+    with open(file, 'w') as out:
+        np.savetxt(out, vertex, fmt='v %.6f %.6f %.6f')
+        np.savetxt(out, index + 1, fmt='f %d %d %d')
+
+writers = {'.ply': write_ply, '.stl': write_stl, '.glb': write_glb, '.obj': write_obj}
+
+def export(obj, file, mtl=None):
+    extension = os.path.splitext(file)[1].lower()
+    if extension not in writers:
+        raise ValueError(f"unsupported export format: {extension}")
+    if extension == '.glb':
+        return write_glb(obj, file, mtl)
+    return writers[extension](obj, file)
@@ -0,0 +1,137 @@
+# HiddenFaces.py - Python script for removing faces that can never be seen
+#
+# Two passes, run before the scene is built:
+#
+# coincident() finds pairs of faces with exactly the same corner positions
+# (rounded to a small fraction of the model size) that face opposite ways,
+# like the touching sides of two parts in an assembly. The corners of every
+# face are sorted into a key, faces with equal keys are grouped with one
+# sort and opposite normals inside a group are paired and both removed.
+#
+# occluded() is an optional sampled visibility test: from a number of
+# directions around the model a grid of parallel rays and one ray at the
+# center of every triangle not seen yet are shot at it (see BVH.py), and
+# faces that are never hit first are removed. Fully enclosed internal
+# surfaces are never hit. A face that is only visible in a gap between the
+# sampled rays is removed too, so more samples make the test safer.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import numpy as np
+
+import BVH
+
+tolerance = 1e-6    # Corner rounding, relative to the model diagonal
+resolution = 128    # Rays per side of the grid shot from every direction
+
+#-------------------------------------------------------------------------------------
+
+def face_table(obj):  # geometry, face and vertex indices of every face, grouped by size
+    table = {}
+    for g, geometry in enumerate(obj.geometry):
+        for f, face in enumerate(geometry.face):
+            if face is None or len(face.vertex) < 3: continue
+            table.setdefault(len(face.vertex), []).append((g, f, face.vertex))
+    return table
+
+def newell(position):  # (k, size, 3) polygons -> (k, 3) unnormalized normals
+    following = np.roll(position, -1, axis=1)
+    return np.cross(position, following).sum(axis=1)
+
+def coincident(obj):  # set of (geometry, face) pairs hidden back to back
+    vertex = np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3)
+    hidden = set()
+    if not len(vertex): return hidden
+
+    low = vertex.min(axis=0)
+    step = max(np.linalg.norm(vertex.max(axis=0) - low) * tolerance, np.finfo(np.float64).tiny)
+    rounded = np.round((vertex - low) / step).astype(np.int64)
+
+    for size, faces in face_table(obj).items():
+        index = np.array([face[2] for face in faces], dtype=np.int64)
+        corner = rounded[index]
+        order = np.lexsort((corner[..., 2], corner[..., 1], corner[..., 0]), axis=-1)
+        key = np.take_along_axis(corner, order[..., None], axis=1).reshape(len(faces), -1)
+
+        rows = np.lexsort(key.T[::-1])
+        key = key[rows]
+        same = np.all(key[1:] == key[:-1], axis=1)
+        if not np.any(same): continue
+
+        normal = newell(vertex[index])
+        starts = np.flatnonzero(np.diff(np.concatenate([[False], same, [False]]).astype(np.int8)) == 1)
+        for start in starts.tolist():
+            end = start + 1
+            while end < len(same) and same[end]: end += 1
+            members = rows[start:end + 1]
+            facing = normal[members] @ normal[members[0]] >= 0.0
+            front, back = members[facing], members[~facing]
+            for i in np.concatenate([front[:len(back)], back[:len(front)]]).tolist():
+                hidden.add((faces[i][0], faces[i][1]))
+
+    return hidden
+
+def directions(count):  # evenly spread unit vectors (Fibonacci sphere)
+    i = np.arange(count) + 0.5
+    z = 1.0 - 2.0 * i / count
+    r = np.sqrt(np.maximum(1.0 - z * z, 0.0))
+    angle = np.pi * (3.0 - np.sqrt(5.0)) * i
+    return np.column_stack([r * np.cos(angle), r * np.sin(angle), z])
+
+def occluded(obj, samples, bvh=None):  # set of (geometry, face) pairs never hit from outside
+    bvh = BVH.build(obj) if bvh is None else bvh
+    if not len(bvh): return set()
+
+    low = bvh.triangle.min(axis=(0, 1))
+    high = bvh.triangle.max(axis=(0, 1))
+    center = (low + high) / 2.0
+    radius = max(np.linalg.norm(high - low) / 2.0, np.finfo(np.float64).tiny)
+    centroid = bvh.triangle.mean(axis=1)
+
+    grid = np.linspace(-radius, radius, resolution)
+    x, y = [a.reshape(-1, 1) for a in np.meshgrid(grid, grid)]
+
+    seen = np.zeros(len(bvh), dtype=bool)
+    for d in directions(samples):
+        helper = np.array([1.0, 0.0, 0.0]) if abs(d[0]) < 0.9 else np.array([0.0, 1.0, 0.0])
+        u = np.cross(d, helper)
+        u /= np.linalg.norm(u)
+        v = np.cross(d, u)
+        origin = center - d * 2.0 * radius + x * u + y * v
+        _, triangle = bvh.raycast_all(origin, d)
+        seen[triangle[triangle >= 0]] = True
+
+        target = centroid[~seen]  # one ray at every face not seen yet, so small faces are not missed
+        origin = target - np.outer((target - center) @ d + 2.0 * radius, d)
+        _, triangle = bvh.raycast_all(origin, d)
+        seen[triangle[triangle >= 0]] = True
+
+    visible = set(zip(bvh.geometry[seen].tolist(), bvh.face[seen].tolist()))
+    everything = set(zip(bvh.geometry.tolist(), bvh.face.tolist()))
+    return everything - visible
+
+def remove(obj, hidden):
+    touched = {g for g, _ in hidden}
+    for g, geometry in enumerate(obj.geometry):
+        if g not in touched: continue
+        geometry.face = [face for f, face in enumerate(geometry.face) if (g, f) not in hidden]
+        geometry.bucket = None
+
+def cull(obj, samples=0):  # remove hidden faces, returns the counts
+    faces = sum(len(geometry.face) for geometry in obj.geometry)
+
+    hidden = coincident(obj)
+    remove(obj, hidden)
+    result = {'faces': faces, 'coincident': len(hidden), 'occluded': 0}
+
+    if samples > 0:
+        hidden = occluded(obj, samples)
+        remove(obj, hidden)
+        result['occluded'] = len(hidden)
+
+    result['after'] = sum(len(geometry.face) for geometry in obj.geometry)
+    return result
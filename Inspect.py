@@ -0,0 +1,255 @@
+# Inspect.py - Python script for checking wavefront obj files without rendering them
+#
+# Streams through the obj file once, record by record, and keeps only
+# counters, running bounds and the set of used materials, so files that
+# are far too big to render can still be checked. Reports counts, bounds,
+# a face arity histogram, the attribute layout of the faces, degenerate
+# faces, out-of-range indices, malformed v/vt/vn records (too few or
+# non-numeric values), missing materials and missing textures.
+# VPython is never imported.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import sys
+import json
+import argparse
+
+import Profiler as profile
+
+from Lazy import lazy
+from Storage import layouts
+
+OBJ = lazy('WavefrontOBJ')
+MTL = lazy('WavefrontMTL')
+
+#-------------------------------------------------------------------------------------
+
+class Report:
+    def __init__(self, file):
+        self.file = file
+        self.size = os.path.getsize(file)
+        self.mtllib = None
+        self.counts = {'v': 0, 'vt': 0, 'vn': 0, 'f': 0, 'l': 0, 'p': 0, 'g': 0, 'usemtl': 0}
+        self.low = [float('inf')] * 3
+        self.high = [float('-inf')] * 3
+        self.arity = {}
+        self.layout = {}
+        self.degenerate = 0
+        self.out_of_range = {'v': 0, 'vt': 0, 'vn': 0}
+        self.malformed = {'v': 0, 'vt': 0, 'vn': 0}
+        self.materials = set()
+        self.missing_materials = []
+        self.missing_textures = []
+        self.mtl_found = True
+        self.mtl_declared = False   # mtllib given, without it the mtl next to the obj is optional
+        self.unknown = {}
+
+    def needs_mtl(self):  # a missing mtl only matters when the obj names it or uses materials
+        return self.mtl_declared or any(m is not None for m in self.materials)
+
+    def bounds(self):
+        if self.counts['v'] == self.malformed['v']: return None
+        return {'min': self.low, 'max': self.high}
+
+    def data(self):
+        return {'file': self.file,
+                'size': self.size,
+                'mtllib': self.mtllib,
+                'counts': self.counts,
+                'bounds': self.bounds(),
+                'arity': {str(k): v for k, v in sorted(self.arity.items())},
+                'layout': self.layout,
+                'degenerate': self.degenerate,
+                'out_of_range': self.out_of_range,
+                'malformed': self.malformed,
+                'materials': sorted(self.materials, key=str),
+                'mtl_found': self.mtl_found,
+                'missing_materials': self.missing_materials,
+                'missing_textures': self.missing_textures,
+                'unknown': self.unknown}
+
+#-------------------------------------------------------------------------------------
+
+def check(item, count, report, key):  # resolve an obj index and count it when invalid
+    try:
+        i = OBJ.index(item, count)
+    except ValueError:
+        report.out_of_range[key] += 1
+        return None
+    if i < 0 or i >= count:
+        report.out_of_range[key] += 1
+        return None
+    return i
+
+def scan(file, report):
+    counts = report.counts
+    low, high = report.low, report.high
+    arity, layout = report.arity, report.layout
+    malformed = report.malformed
+
+    report.mtllib = file
+
+    for command, data in OBJ.records(file):
+        if command == 'v':
+            counts['v'] += 1
+            try:
+                vertex = float(data[0]), float(data[1]), float(data[2])
+            except (IndexError, ValueError):
+                malformed['v'] += 1
+                continue
+            for axis in range(3):
+                value = vertex[axis]
+                if value < low[axis]: low[axis] = value
+                if value > high[axis]: high[axis] = value
+
+        elif command == 'vt':
+            counts['vt'] += 1
+            try:
+                float(data[0]), float(data[1])
+            except (IndexError, ValueError):
+                malformed['vt'] += 1
+
+        elif command == 'vn':
+            counts['vn'] += 1
+            try:
+                float(data[0]), float(data[1]), float(data[2])
+            except (IndexError, ValueError):
+                malformed['vn'] += 1
+
+        elif command == 'f':
+            counts['f'] += 1
+            size = len(data)
+            arity[size] = arity.get(size, 0) + 1
+
+            first = data[0].split('/') if data else ['']
+            kind = layouts[(len(first) > 1 and bool(first[1])) + 2 * (len(first) > 2 and bool(first[2]))]
+            layout[kind] = layout.get(kind, 0) + 1
+
+            vertices = []
+            for group in data:
+                indices = group.split('/')
+                if indices[0]:
+                    vertices.append(check(indices[0], counts['v'], report, 'v'))
+                if len(indices) > 1 and indices[1]:
+                    check(indices[1], counts['vt'], report, 'vt')
+                if len(indices) > 2 and indices[2]:
+                    check(indices[2], counts['vn'], report, 'vn')
+
+            vertices = [v for v in vertices if v is not None]  # bad indices are only counted as out of range
+            if size < 3 or len(set(vertices)) < len(vertices):
+                report.degenerate += 1
+
+        elif command in ('l', 'p'):
+            counts[command] += 1
+            for item in data:
+                check(item, counts['v'], report, 'v')
+
+        elif command == 'g': counts['g'] += 1
+
+        elif command == 'usemtl':
+            counts['usemtl'] += 1
+            report.materials.add(data[0] if data else None)
+
+        elif command == 'mtllib':
+            report.mtl_declared = True
+            report.mtllib = os.path.join(os.path.split(file)[0], data[0]) if data else file
+
+        elif command not in ('o', 's') and not command.startswith('#'):
+            report.unknown[command] = report.unknown.get(command, 0) + 1
+
+def load_mtl(file):
+    mtl = MTL.WavefrontMTL()
+    mtl.load(file)
+    return mtl
+
+def check_materials(report, loader=load_mtl):
+    file = MTL.mtlFile(report.mtllib)
+
+    if not os.path.exists(file):
+        report.mtl_found = False
+        report.missing_materials = sorted((m for m in report.materials if m is not None), key=str)
+        return
+
+    mtl = loader(file)
+
+    names = {material.name for material in mtl.materials}
+    report.missing_materials = sorted(m for m in report.materials if m is not None and m not in names)
+
+    for material in mtl.materials:
+        for texture in (material.map_Kd, material.map_Ka, material.map_Ks, material.map_Ns, material.map_d):
+            if texture is not None and not os.path.exists(texture):
+                report.missing_textures.append(texture)
+
+def inspect(file, loader=load_mtl):
+    report = Report(file)
+    with profile.stage('obj'):
+        scan(file, report)
+    with profile.stage('mtl'):
+        check_materials(report, loader)
+    return report
+
+#-------------------------------------------------------------------------------------
+
+def print_report(report, timings):
+    print(f"file: {report.file} ({report.size / 2**20:.1f} MB)")
+    print(f"mtllib: {report.mtllib}" + ("" if report.mtl_found else " (not found)"))
+    print("counts: " + " / ".join(f"{key} {value}" for key, value in report.counts.items()))
+    bounds = report.bounds()
+    if bounds:
+        print(f"bounds: min {bounds['min']} / max {bounds['max']}")
+    print("arity: " + " / ".join(f"{key}: {value}" for key, value in sorted(report.arity.items())))
+    print("layout: " + " / ".join(f"{key}: {value}" for key, value in report.layout.items()))
+    print(f"degenerate faces: {report.degenerate}")
+    print("out of range: " + " / ".join(f"{key} {value}" for key, value in report.out_of_range.items()))
+    if any(report.malformed.values()):
+        print("malformed: " + " / ".join(f"{key} {value}" for key, value in report.malformed.items()))
+    if report.missing_materials:
+        print(f"missing materials: {', '.join(report.missing_materials)}")
+    if report.missing_textures:
+        print(f"missing textures: {', '.join(report.missing_textures)}")
+    if report.unknown:
+        print("unknown: " + " / ".join(f"{key} {value}" for key, value in report.unknown.items()))
+    for name, timing in timings.items():
+        print(f"time: {name:<4} wall {timing['wall']:.3f} s / cpu {timing['cpu']:.3f} s")
+
+description = 'Inspect and validate a Wavefront .obj file without rendering it'
+
+def main():
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filename', nargs='+', help='The .obj files to inspect')
+    parser.add_argument('-j', '--json', action='store_true', help='Print the reports as json')
+    args = parser.parse_args()
+
+    profile.enable()
+
+    results = []
+    missing = False
+    for file in args.filename:
+        if not os.path.isfile(file):
+            print(f"Error: The file {file} does not exist.", file=sys.stderr)
+            missing = True
+            continue
+        profile.reset()
+        report = inspect(file)
+        timings = profile.report()['stages']
+        if args.json:
+            data = report.data()
+            data['timings'] = timings
+            results.append(data)
+        else:
+            print_report(report, timings)
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)   # a list for any number of files
+        print()
+
+    if missing:
+        sys.exit(1)
+
+if __name__ == "__main__":
+     main()
@@ -0,0 +1,346 @@
+# Instancing.py - Python script for detecting repeated parts in wavefront obj models
+#
+# Assemblies often contain many geometrically identical parts that only
+# differ by a rigid transform (rotation + translation). This script splits
+# every geometry into connected components and hashes what does not depend
+# on the coordinates (material, vertex count and face sizes). Components
+# with the same hash are brought into canonical frames and compared there:
+# they are congruent when every vertex has a counterpart closer than the
+# tolerance and the faces join the same vertices. The tolerance is relative
+# to the model diagonal and never below the storage error of the vertices
+# (float32 and quantized16, see WavefrontOBJ.storage), so a model is split
+# into the same parts at every precision. The part can be built once and
+# cloned for the others. Congruent components are only cloned from each
+# other when their texture coordinates and (rotated) normals match corner
+# by corner too.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import hashlib
+import itertools
+import numpy as np
+
+tolerance = 1e-5           # Coordinates closer than this fraction of the model diagonal are considered equal
+errorMargin = 4.0          # Never closer than this many times the largest storage error of the vertices
+frameTolerance = 1e-2      # Vertices closer than this fraction of the part radius are paired to correct its frame
+anchorPairs = 64           # Most vertex pairs tried as anchors when no other frame matches, see anchor_frames()
+attributeTolerance = 1e-3  # Texture coordinates and normals of congruent parts closer than this are considered equal
+
+#-------------------------------------------------------------------------------------
+
+class Part:
+    def __init__(self, geometry, faces, vertices):
+        self.geometry = geometry    # Index into obj.geometry
+        self.faces = faces          # Indices into obj.geometry[geometry].face
+        self.vertices = vertices    # Indices into obj.vertex
+        self.center = None          # Centroid of the part vertices
+        self.frame = None           # Canonical frame (columns are axes)
+        self.frames = []            # Candidate frames, the one matching the reference is kept, see split()
+        self.radii = None           # Sorted distances of the vertices from the center
+        self.coarse = None          # Distance within which vertices are paired to correct the frame
+        self.stable = False         # Whether the first frames are close enough to be corrected, see candidate_frames()
+        self.key = None             # Hash of material, vertex count and face sizes
+
+    def rotation(self, reference):  # Rotation mapping reference onto this part
+        return self.frame @ reference.frame.T
+
+class Shape:  # what a part is compared by, see congruent()
+    def __init__(self, obj, vertex, part, step):
+        self.part = part
+        self.points = (vertex[part.vertices] - part.center) @ part.frame
+        self.fine = Grid(self.points, step)
+        self.coarse = Grid(self.points, part.coarse)
+        self.label = match(self.fine, self.points)  # vertices closer than step share a label
+        self.faces, rows = corners(obj, part, self.label)
+        self.values, self.has = attributes(obj, part, rows)
+
+        radius = np.linalg.norm(self.points, axis=1)
+        first = int(np.argmax(radius))
+        side = np.linalg.norm(np.cross(self.points, self.points[first]), axis=1) / max(radius[first], step)
+        second = int(np.argmax(side))
+        self.anchors = (first, second) if side[second] > part.coarse else None  # far out and far from the line through the first
+
+class Instances:
+    def __init__(self, key, parts):
+        self.key = key
+        self.parts = parts          # parts[0] is the reference part
+
+    def reference(self): return self.parts[0]
+    def clones(self): return self.parts[1:]
+
+#-------------------------------------------------------------------------------------
+
+def face_array(faces, attribute='vertex'):
+    vertex = [getattr(face, attribute) for face in faces]
+    size = np.fromiter((len(v) for v in vertex), dtype=np.int64, count=len(vertex))
+    flat = np.fromiter(itertools.chain.from_iterable(vertex), dtype=np.int64, count=int(size.sum()))
+    return flat, size
+
+def corner_values(faces, attribute, size, data):  # value of every face corner and whether the face has it
+    flat, count = face_array(faces, attribute)
+    has = np.repeat(count == size, size)
+    values = np.zeros((len(has), 3))
+    if np.any(has):
+        keep = np.repeat(count == size, count)
+        values[has] = np.asarray(data[flat[keep]], dtype=np.float64).reshape(-1, 3)
+    return values, has
+
+def label_components(flat, size, count):
+    # Connected vertices end up with the same label (smallest vertex index)
+    labels = np.arange(count, dtype=np.int64)
+
+    start = np.cumsum(size) - size
+
+    a = flat
+    b = np.repeat(flat[start], size)  # Link every face vertex to the first one
+
+    while True:
+        m = np.minimum(labels[a], labels[b])
+        update = labels.copy()
+        np.minimum.at(update, a, m)
+        np.minimum.at(update, b, m)
+        update = update[update]  # pointer jumping
+        if np.array_equal(update, labels): break
+        labels = update
+
+    return labels
+
+def components(obj, g):
+    geometry = obj.geometry[g]
+
+    faces = [i for i, face in enumerate(geometry.face) if len(face.vertex) >= 3]
+
+    if not faces: return []
+
+    flat, size = face_array([geometry.face[i] for i in faces])
+
+    labels = label_components(flat, size, len(obj.vertex))
+
+    start = np.cumsum(size) - size
+    face_label = labels[flat[start]]
+
+    order = np.argsort(face_label, kind='stable')
+    split = np.flatnonzero(np.diff(face_label[order])) + 1
+
+    faces = np.asarray(faces, dtype=np.int64)
+
+    parts = []
+    for group in np.split(order, split):
+        part_faces = faces[group]
+        used = np.concatenate([flat[start[i]:start[i] + size[i]] for i in group])
+        parts.append(Part(g, part_faces.tolist(), np.unique(used)))
+
+    return parts
+
+#-------------------------------------------------------------------------------------
+
+def cube_rotations():
+    rotations = []
+    for permutation in itertools.permutations(range(3)):
+        for signs in itertools.product([1, -1], repeat=3):
+            r = np.zeros((3, 3))
+            for column, (row, sign) in enumerate(zip(permutation, signs)):
+                r[row, column] = sign
+            if np.linalg.det(r) > 0:
+                rotations.append(r)
+    return rotations
+
+cubeRotations = cube_rotations()
+
+pcaFlips = [np.diag(d) for d in ([1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1])]
+
+neighbours = np.array(sorted(itertools.product((-1, 0, 1), repeat=3), key=lambda offset: offset != (0, 0, 0)))  # own cell first
+
+def spacing(obj, vertex):  # coordinates closer than this are considered equal
+    if not len(vertex): return tolerance
+    diagonal = float(np.linalg.norm(vertex.max(axis=0) - vertex.min(axis=0)))
+    error = getattr(obj, 'error', {}).get('vertex')
+    bound = float(np.max(error)) if error is not None and len(error) else 0.0
+    return max(tolerance * diagonal, errorMargin * bound) or tolerance
+
+def candidate_frames(points, step, coarse):  # frames to try and whether the principal axes are stable
+    covariance = points.T @ points / len(points)
+    values, vectors = np.linalg.eigh(covariance)
+
+    if np.linalg.det(vectors) < 0:
+        vectors[:, 2] = -vectors[:, 2]
+
+    noise = 2.0 * step * np.sqrt(max(values[-1], 0.0))  # eigenvalue change from moving the points by step
+    gaps = np.diff(values)
+
+    frames = []
+    if len(points) >= 3 and np.all(gaps > 1e-3 * values[-1]):
+        frames += [vectors @ flip for flip in pcaFlips]     # a bit off for small gaps, see congruent()
+    if not frames or np.any(gaps <= max(1e-3 * values[-1], noise)):
+        frames += cubeRotations  # Degenerate spread, also try axis aligned frames
+
+    radius = np.sqrt(np.max(np.einsum('ij,ij->i', points, points)))
+    stable = len(frames) == len(pcaFlips) and bool(np.all(gaps * coarse >= 2.0 * radius * noise))  # off by less than coarse / 2 at the rim
+    return frames, stable
+
+def canonical(obj, vertex, part, step):
+    geometry = obj.geometry[part.geometry]
+
+    points = vertex[part.vertices]
+    center = points.mean(axis=0)
+    points = points - center
+
+    size = np.fromiter((len(geometry.face[i].vertex) for i in part.faces), dtype=np.int64, count=len(part.faces))
+
+    h = hashlib.sha1(f"{geometry.material}|{len(points)}|{np.bincount(size).tolist()}".encode())
+    part.key = h.hexdigest()
+    part.center = center
+    part.radii = np.sort(np.linalg.norm(points, axis=1))
+    part.coarse = max(4.0 * step, frameTolerance * part.radii[-1])
+    part.frames, part.stable = candidate_frames(points, step, part.coarse)
+    part.frame = part.frames[0]
+
+class Grid:  # points sorted by the cell of side step they are in, see match()
+    def __init__(self, points, step):
+        self.step = step
+        self.low = points.min(axis=0) - step                    # no point in the outer cells, see match()
+        cell = np.floor((points - self.low) / step).astype(np.int64)
+        self.dims = cell.max(axis=0) + 2
+        self.strides = np.array([self.dims[1] * self.dims[2], self.dims[2], 1])  # fits in int64 as step >= tolerance * diagonal
+        keys = cell @ self.strides
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+def match(grid, points):  # for every point the first point of grid in the same or a neighbouring cell, -1 for none
+    cell = np.floor((points - grid.low) / grid.step).astype(np.int64)
+    inside = np.all((cell >= 0) & (cell < grid.dims), axis=1)   # the neighbours of these only wrap into empty outer cells
+
+    wanted = (cell @ grid.strides)[:, None] + neighbours @ grid.strides
+    i = np.minimum(np.searchsorted(grid.keys, wanted), len(grid.keys) - 1)
+    hit = (grid.keys[i] == wanted) & inside[:, None]
+    first = hit.argmax(axis=1)
+    rows = np.arange(len(points))
+    return np.where(hit[rows, first], grid.order[i[rows, first]], -1)
+
+def corners(obj, part, label):  # corner labels of the faces, each from its lowest label on, faces in sorted order, and their rows
+    geometry = obj.geometry[part.geometry]
+    flat, size = face_array([geometry.face[i] for i in part.faces])
+    labels = label[np.searchsorted(part.vertices, flat)]
+
+    start = np.cumsum(size) - size
+    face = np.repeat(np.arange(len(size)), size)
+    position = np.arange(len(flat)) - start[face]
+    lowest = np.flatnonzero(labels == np.minimum.reduceat(labels, start)[face])[::-1]
+    first = np.zeros(len(size), dtype=np.int64)
+    first[face[lowest]] = position[lowest]  # the first lowest corner of every face is written last
+
+    rows = []
+    for n in np.unique(size).tolist():     # faces sorted by size, then by their labels
+        which = np.flatnonzero(size == n)
+        block = start[which, None] + (np.arange(n) + first[which, None]) % n
+        rows.append(block[np.lexsort(labels[block].T[::-1])].ravel())
+    rows = np.concatenate(rows)
+    return labels[rows], rows
+
+def attributes(obj, part, rows):  # texture coordinates and normals in the canonical frame of the corners in rows
+    geometry = obj.geometry[part.geometry]
+    faces = [geometry.face[i] for i in part.faces]
+    _, size = face_array(faces)
+
+    texture, has_texture = corner_values(faces, 'texture', size, obj.texture)
+    normal, has_normal = corner_values(faces, 'normal', size, obj.normal)
+    values = np.concatenate([texture, normal @ part.frame], axis=1)
+    has = np.stack([has_texture, has_normal], axis=1)
+    return values[rows], has[rows]
+
+def kabsch(b, a):  # rotation R with b @ R closest to a
+    u, _, vt = np.linalg.svd(b.T @ a)
+    d = np.sign(np.linalg.det(u @ vt)) or 1.0
+    return u @ np.diag([1.0, 1.0, d]) @ vt
+
+def basis(p, q):  # right handed orthonormal columns, the first along p, the second towards q, None when they are parallel
+    e1 = p / np.linalg.norm(p)
+    e2 = q - (q @ e1) * e1
+    length = np.linalg.norm(e2)
+    if length <= 1e-9 * np.linalg.norm(q): return None
+    e2 = e2 / length
+    e3 = [e1[1] * e2[2] - e1[2] * e2[1], e1[2] * e2[0] - e1[0] * e2[2], e1[0] * e2[1] - e1[1] * e2[0]]
+    return np.stack([e1, e2, e3], axis=1)
+
+def anchor_frames(shape, points):  # frames turning vertex pairs of the part onto the anchors of shape
+    if shape.anchors is None: return
+    p, q = shape.points[list(shape.anchors)]
+    reference = basis(p, q)
+    tolerance = shape.part.coarse
+
+    radius = np.linalg.norm(points, axis=1)
+    ones = np.flatnonzero(np.abs(radius - np.linalg.norm(p)) <= tolerance)[:anchorPairs]
+    twos = np.flatnonzero(np.abs(radius - np.linalg.norm(q)) <= tolerance)[:anchorPairs]
+    distance = np.linalg.norm(points[ones][:, None, :] - points[twos][None, :, :], axis=2)
+    i, j = np.nonzero(np.abs(distance - np.linalg.norm(p - q)) <= 2.0 * tolerance)
+
+    for one, two in zip(ones[i[:anchorPairs]], twos[j[:anchorPairs]]):
+        frame = basis(points[one], points[two])
+        if frame is not None: yield frame @ reference.T
+
+def congruent(obj, vertex, shape, part, step):  # turns part until it matches shape, False when no frame does
+    if np.any(np.abs(shape.part.radii - part.radii) > 4.0 * step): return False
+
+    points = vertex[part.vertices] - part.center
+    anchors = () if part.stable else anchor_frames(shape, points)  # stable principal axes leave no other way to turn it
+    for frame in itertools.chain(part.frames, anchors):   # the first frame that matches is kept
+        found = match(shape.fine, points @ frame)
+        if np.any(found < 0):
+            found = match(shape.coarse, points @ frame)
+            if np.any(found < 0): continue
+
+            frame = frame @ kabsch(points @ frame, shape.points[found])  # the frame of a noisy part is a bit off
+            found = match(shape.fine, points @ frame)
+            if np.any(found < 0): continue
+
+        part.frame = frame @ kabsch(points @ frame, shape.points[found])  # best fit, clones are placed with it
+        faces, rows = corners(obj, part, shape.label[found])
+        if not np.array_equal(faces, shape.faces): continue
+
+        values, has = attributes(obj, part, rows)
+        if np.array_equal(has, shape.has) and bool(np.all(np.abs(values - shape.values) <= attributeTolerance)):
+            return True
+
+    part.frame = part.frames[0]
+    return False
+
+def split(obj, vertex, parts, step):  # parts with the same key, grouped by shape, texture coordinates and normals
+    groups = []
+    for part in parts:
+        members = next((members for shape, members in groups if congruent(obj, vertex, shape, part, step)), None)
+        if members is not None:
+            members.append(part)
+        else:
+            groups.append((Shape(obj, vertex, part, step), [part]))
+    return [members for _, members in groups]
+
+#-------------------------------------------------------------------------------------
+
+def instances(obj):
+    vertex = np.asarray(obj.vertex, dtype=np.float64)
+    step = spacing(obj, vertex)
+    groups = {}
+    for g in range(len(obj.geometry)):
+        for part in components(obj, g):
+            canonical(obj, vertex, part, step)
+            groups.setdefault(part.key, []).append(part)
+
+    # Clones show the texture coordinates of the reference part and its normals rotated
+    result = []
+    for key, parts in groups.items():
+        if len(parts) == 1:
+            result.append(Instances(key, parts))
+            continue
+        for n, members in enumerate(split(obj, vertex, parts, step)):
+            result.append(Instances(key if n == 0 else f"{key}.{n}", members))
+    return result
+
+def report(groups):
+    parts = sum(len(group.parts) for group in groups)
+    faces = sum(len(group.parts) * len(group.reference().faces) for group in groups)
+    unique = sum(len(group.reference().faces) for group in groups)
+    print(f"instancing: {parts} parts / {len(groups)} unique / faces : {faces} -> {unique}")
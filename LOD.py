@@ -0,0 +1,99 @@
+# LOD.py - Python script for building levels of detail of wavefront obj models
+#
+# Coarser levels are made by vertex clustering: the vertices are snapped to
+# a grid, every grid cell becomes one vertex (the mean of its vertices) and
+# triangles that collapse or end up duplicated are dropped. Each level
+# doubles the cell size of the previous one, starting from a fraction of
+# the model diagonal. The work is vectorized over all triangles at once and
+# every triangle keeps its geometry, so a viewer can color it by material.
+#
+# select() picks the coarsest level whose cell is still smaller than a few
+# pixels on screen for a given camera distance and view range.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import numpy as np
+
+import Compile
+
+levelCount = 4          # Coarse levels in addition to the full detail
+firstCell = 1.0 / 256   # Cell size of the first coarse level, relative to the diagonal
+pixels = 2.0            # Largest cell size on screen before a finer level is used
+
+#-------------------------------------------------------------------------------------
+
+class Level:
+    def __init__(self, cell, vertex, index, geometry):
+        self.cell = cell            # Grid cell size, 0 for full detail
+        self.vertex = vertex        # (n, 3) cluster positions
+        self.index = index          # (m, 3) triangle vertex indices
+        self.geometry = geometry    # (m,) geometry of every triangle
+
+    def __len__(self): return len(self.index)
+
+    def normals(self):  # flat triangle normals
+        return Compile.flat_normals(self.vertex[self.index])
+
+#-------------------------------------------------------------------------------------
+
+def cluster(vertex, index, geometry, cell):  # one vertex clustering pass
+    low = vertex.min(axis=0)
+    key = np.floor((vertex - low) / cell).astype(np.int64)
+    dims = key.max(axis=0) + 1
+    code = (key[:, 0] * dims[1] + key[:, 1]) * dims[2] + key[:, 2]
+    _, inverse = np.unique(code, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    count = np.bincount(inverse).astype(np.float64)
+    merged = np.column_stack([np.bincount(inverse, weights=vertex[:, axis]) for axis in range(3)])
+    merged /= count[:, None]
+
+    index = inverse[index]
+    keep = (index[:, 0] != index[:, 1]) & (index[:, 1] != index[:, 2]) & (index[:, 2] != index[:, 0])
+    index, geometry = index[keep], geometry[keep]
+
+    corners = np.sort(index, axis=1)
+    order = np.lexsort((corners[:, 2], corners[:, 1], corners[:, 0], geometry))
+    key = np.column_stack([geometry[order], corners[order]])
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(key[1:] != key[:-1], axis=1)
+    first = np.sort(order[first])
+    index, geometry = index[first], geometry[first]
+
+    used, index = np.unique(index, return_inverse=True)
+    return merged[used], index.reshape(-1, 3), geometry
+
+def levels(obj, count=levelCount):  # full detail first, then coarser and coarser
+    index, geometry = Compile.triangles(obj)
+    vertex = np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3)
+
+    result = [Level(0.0, vertex, index, geometry)]
+    if not len(index): return result
+
+    used = vertex[np.unique(index)]
+    diagonal = np.linalg.norm(used.max(axis=0) - used.min(axis=0))
+    if diagonal <= 0.0: return result
+
+    cell = diagonal * firstCell
+    for _ in range(count):
+        vertex, index, geometry = cluster(vertex, index, geometry, cell)
+        result.append(Level(cell, vertex, index, geometry))
+        if len(index) == 0: break
+        cell *= 2.0
+    return result
+
+def select(levels, distance, view, fov, height):  # index of the level to show
+    extent = max(view, distance * np.tan(fov / 2.0))   # half of the visible height
+    size = 2.0 * extent / height                        # model units per pixel
+    best = 0
+    for i, level in enumerate(levels):
+        if level.cell <= pixels * size and len(level): best = i
+    return best
+
+def report(levels):
+    for i, level in enumerate(levels):
+        print(f"lod: level {i} / cell {level.cell:.3g} / triangles : {len(level)}")
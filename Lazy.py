@@ -0,0 +1,28 @@
+# Lazy.py - Python script for deferring module imports until first use
+#
+# lazy(name) returns the module right away but only executes it when one
+# of its attributes is used for the first time, so command line tools only
+# pay for VPython, numpy and friends on the code paths that need them.
+# After the first use it is an ordinary module with no extra overhead.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import sys
+import importlib.util
+
+def lazy(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
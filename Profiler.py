@@ -0,0 +1,119 @@
+# Profiler.py - Python script for timing the stages of loading a model
+#
+# Stages are timed with wall clock and process (cpu) time and accumulated
+# by name, so a stage entered many times reports its total. Counters are
+# simple named integers. When profiling is disabled stage() returns a
+# shared no-op context and count() returns immediately.
+#
+# With memory tracking on, tracemalloc also records the peak and the
+# retained (still allocated at exit) memory of every stage, and the report
+# lists the allocations that are left per module.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import json
+import time
+import tracemalloc
+
+enabled = False
+memory = False
+
+stages = {}     # name -> [calls, wall, cpu, peak, retained]
+counters = {}   # name -> value
+active = []     # stages entered while tracking memory
+
+#-------------------------------------------------------------------------------------
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if memory:
+            self.current, peak = tracemalloc.get_traced_memory()
+            if active: active[-1].peak = max(active[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.peak = self.current
+            active.append(self)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exception):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        item = stages.setdefault(self.name, [0, 0.0, 0.0, 0, 0])
+        item[0] += 1
+        item[1] += wall
+        item[2] += cpu
+        if memory and active and active[-1] is self:
+            active.pop()
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(self.peak, peak)
+            if active: active[-1].peak = max(active[-1].peak, peak)
+            item[3] = max(item[3], peak - self.current)
+            item[4] += current - self.current
+        return False
+
+class NoStage:
+    def __enter__(self): return self
+    def __exit__(self, *exception): return False
+
+noStage = NoStage()
+
+#-------------------------------------------------------------------------------------
+
+def enable(on=True, trace=False):
+    global enabled, memory
+    enabled = on
+    memory = on and trace
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def reset():
+    stages.clear()
+    counters.clear()
+    active.clear()
+
+def modules(top=20):  # memory still allocated, grouped by source file
+    if not tracemalloc.is_tracing(): return {}
+    statistics = tracemalloc.take_snapshot().statistics('filename')
+    return {stat.traceback[0].filename: {'size': stat.size, 'count': stat.count}
+            for stat in statistics[:top]}
+
+def stage(name):
+    if not enabled: return noStage
+    return Stage(name)
+
+def count(name, value=1):
+    if not enabled: return
+    counters[name] = counters.get(name, 0) + value
+
+def report():
+    data = {'stages': {}, 'counters': dict(counters)}
+    for name, (calls, wall, cpu, peak, retained) in stages.items():
+        data['stages'][name] = {'calls': calls, 'wall': wall, 'cpu': cpu}
+        if memory:
+            data['stages'][name].update(peak=peak, retained=retained)
+    if memory:
+        data['modules'] = modules()
+    return data
+
+def write(path, **info):
+    data = dict(info)
+    data.update(report())
+    with open(path, 'w') as out:
+        json.dump(data, out, indent=2)
+
+def show():
+    for name, (calls, wall, cpu, peak, retained) in stages.items():
+        line = f"profile: {name:<12} wall {wall:8.3f} s / cpu {cpu:8.3f} s / calls {calls}"
+        if memory:
+            line += f" / peak {peak / 2**20:8.1f} MB / retained {retained / 2**20:8.1f} MB"
+        print(line)
+    for name, value in counters.items():
+        print(f"profile: {name:<20} {value}")
@@ -0,0 +1,324 @@
+# Server.py - Python script for serving compiled wavefront obj models to viewers
+#
+# A long-running local server (HTTP on localhost) that parses and compiles
+# models once (see Compile.py) and keeps the render arrays of the most
+# recently used models in shared memory, bounded by a memory budget. A
+# viewer asks for a model by path and gets back the name of the shared
+# memory block and the layout of the arrays in it, and maps the arrays
+# directly instead of parsing the file itself. Models are keyed by path,
+# size, modification time and precision, so an edited file is compiled
+# again. An evicted model is unlinked only after a lease, so a viewer that
+# just got its layout can still map it. A viewer that cannot map a model
+# asks again and finally falls back to parsing the file itself.
+#
+# The server can be shared by the accounts on one machine: the blocks are
+# created readable by everyone and writable by the server only (--mode),
+# and viewers map them read-only where the blocks are files (/dev/shm).
+# The server account must be able to read the model files.
+#
+# GET /model?file=PATH&precision=P   layout of the compiled model
+# GET /stats                         hits, misses, hit rate, latency, memory
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import json
+import mmap
+import time
+import signal
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import Compile
+
+address = ('127.0.0.1', 8765)
+budget = 1024 * 2**20   # Bytes of compiled models kept in shared memory
+alignment = 64
+lease = 30.0            # Seconds an evicted model stays mappable for viewers that already got its layout
+mode = 0o644            # Permissions of the shared memory blocks, viewers of other accounts map them read-only
+shm = '/dev/shm'        # Where POSIX shared memory blocks are files
+attempts = 3            # Requests by a viewer when the model was unlinked before it could map it
+
+#-------------------------------------------------------------------------------------
+
+class Entry:
+    def __init__(self, block, layout, size):
+        self.block = block      # SharedMemory holding all arrays of the model
+        self.layout = layout    # json description of the arrays, see pack()
+        self.size = size
+
+    def release(self):
+        self.block.close()
+        self.block.unlink()     # viewers that mapped it keep their mapping
+
+class Models:  # least recently used compiled models, bounded by bytes
+    def __init__(self, budget, mode=mode):
+        self.budget = budget
+        self.mode = mode
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.pending = {}       # key -> Event set when the model being compiled is ready
+        self.retired = []       # (time, Entry) evicted, unlinked when their lease is over
+        self.hits = 0
+        self.misses = 0
+        self.latency = deque(maxlen=1000)   # seconds of the last served model requests
+
+    def get(self, file, precision):
+        stat = os.stat(file)
+        key = (os.path.abspath(file), stat.st_size, stat.st_mtime_ns, precision)
+        while True:
+            with self.lock:
+                self.expire()
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                pending = self.pending.get(key)
+                if pending is None:
+                    pending = self.pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()  # the same model is compiled by another request
+
+        entry = None
+        try:
+            entry = compile_model(file, precision, self.mode)  # without the lock, other requests are served meanwhile
+        finally:
+            with self.lock:
+                del self.pending[key]
+                if entry is not None: self.insert(key, entry)
+            pending.set()
+        return entry
+
+    def insert(self, key, entry):  # call with the lock held
+        self.entries[key] = entry
+        self.size += entry.size
+        for old in list(self.entries):
+            if self.size <= self.budget or old == key: continue
+            evicted = self.entries.pop(old)
+            self.size -= evicted.size
+            self.retired.append((time.monotonic() + lease, evicted))
+
+    def expire(self, everything=False):  # unlink evicted models whose lease is over, call with the lock held
+        now = time.monotonic()
+        for until, entry in self.retired:
+            if everything or until <= now: entry.release()
+        self.retired = [(until, entry) for until, entry in self.retired if not everything and until > now]
+
+    def record(self, seconds):
+        with self.lock:
+            self.latency.append(seconds)
+
+    def stats(self):
+        with self.lock:
+            self.expire()
+            latency = np.array(self.latency) * 1000.0
+            requests = self.hits + self.misses
+            return {'models': len(self.entries),
+                    'bytes': self.size,
+                    'retired_bytes': sum(entry.size for _, entry in self.retired),
+                    'budget': self.budget,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / requests if requests else 0.0,
+                    'latency_ms': {'mean': float(latency.mean()) if len(latency) else 0.0,
+                                   'p50': float(np.percentile(latency, 50)) if len(latency) else 0.0,
+                                   'p95': float(np.percentile(latency, 95)) if len(latency) else 0.0}}
+
+    def close(self):
+        with self.lock:
+            for entry in self.entries.values(): entry.release()
+            self.entries.clear()
+            self.expire(everything=True)
+            self.size = 0
+
+#-------------------------------------------------------------------------------------
+
+def pack(meshes):  # layout with aligned offsets of every array, and the total size
+    layout, offset = [], 0
+    for mesh in meshes:
+        arrays = {}
+        for name in ('position', 'normal', 'texpos', 'face'):
+            array = getattr(mesh, name)
+            if array is None: continue
+            arrays[name] = {'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str}
+            offset += -(-array.nbytes // alignment) * alignment
+        layout.append({'material': mesh.material, 'arrays': arrays})
+    return layout, offset
+
+def compile_model(file, precision, mode=mode):
+    from WavefrontOBJ import WavefrontOBJ
+
+    obj = WavefrontOBJ()
+    obj.load(file, precision)
+    meshes = Compile.meshes(obj)
+
+    layout, size = pack(meshes)
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    if hasattr(os, 'fchmod') and getattr(block, '_fd', -1) >= 0:
+        os.fchmod(block._fd, mode & ~0o022)  # POSIX creates it 0o600, others may read it but never write
+    for mesh, item in zip(meshes, layout):
+        for name, array in item['arrays'].items():
+            view = np.ndarray(array['shape'], dtype=array['dtype'], buffer=block.buf, offset=array['offset'])
+            view[...] = getattr(mesh, name)
+
+    return Entry(block, {'name': block.name, 'mtllib': obj.mtllib, 'meshes': layout}, size)
+
+#-------------------------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    models = None
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path == '/stats':
+            self.reply(200, self.models.stats())
+            return
+
+        if url.path != '/model':
+            self.reply(404, {'error': f"unknown path: {url.path}"})
+            return
+
+        file = query.get('file', [''])[0]
+        precision = query.get('precision', ['float64'])[0]
+        if not os.path.isfile(file):
+            self.reply(404, {'error': f"file not found: {file}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            entry = self.models.get(file, precision)
+        except Exception as error:
+            self.reply(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+        self.models.record(time.perf_counter() - start)
+        self.reply(200, entry.layout)
+
+    def log_message(self, format, *args):
+        pass
+
+def stop(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)   # a second kill must not interrupt the cleanup
+    raise KeyboardInterrupt()
+
+def serve(host, port, memory, mode=mode):
+    signal.signal(signal.SIGTERM, stop)     # release the shared memory on kill too
+    Handler.models = Models(memory, mode)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"server: http://{host}:{port} / memory {memory / 2**20:.0f} MB")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        server.server_close()
+        Handler.models.close()
+
+#-------------------------------------------------------------------------------------
+
+class Model:  # compiled meshes mapped from the server, keep it alive while the arrays are used
+    def __init__(self, layout):
+        self.mtllib = layout['mtllib']
+        self.block, buffer = attach(layout['name'])
+        self.meshes = []
+        for item in layout['meshes']:
+            mesh = Compile.Mesh(item['material'])
+            for name, array in item['arrays'].items():
+                view = np.ndarray(array['shape'], dtype=array['dtype'], buffer=buffer, offset=array['offset'])
+                view.flags.writeable = False
+                setattr(mesh, name, view)
+            self.meshes.append(mesh)
+
+def attach(name):  # (block, buffer) of a block, read-only where it is a file
+    path = os.path.join(shm, name.lstrip('/'))
+    if os.path.isdir(shm):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            block = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        return block, block
+    block = share(name)
+    return block, block.buf
+
+def share(name):  # map a block without letting this process unlink it at exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+def request(path, host, port, timeout=600.0):
+    with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=timeout) as response:
+        return json.load(response)
+
+def fetch(file, precision='float64', host=address[0], port=address[1]):  # Model or None, then parse the file
+    query = urllib.parse.urlencode({'file': os.path.abspath(file), 'precision': precision})
+    for _ in range(attempts):
+        try:
+            layout = request(f"/model?{query}", host, port)
+        except urllib.error.HTTPError as error:
+            print(f"server: {json.load(error).get('error', error.reason)}")
+            return None
+        except OSError as error:
+            print(f"server: {host}:{port} not available ({error})")
+            return None
+        try:
+            return Model(layout)
+        except OSError as error:    # evicted and unlinked in between, or not allowed to map it
+            failure = error
+    print(f"server: cannot map the model ({failure})")
+    return None
+
+def stats(host=address[0], port=address[1]):
+    return request('/stats', host, port, timeout=10.0)
+
+#-------------------------------------------------------------------------------------
+
+description = 'Serve compiled Wavefront .obj models to viewers through shared memory'
+
+def main():
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--host', default=address[0], help='Address to listen on')
+    parser.add_argument('--port', type=int, default=address[1], help='Port to listen on')
+    parser.add_argument('-m', '--memory', type=float, default=budget / 2**20, help='Memory budget for compiled models in MB')
+    parser.add_argument('--mode', type=lambda text: int(text, 8), default=mode, help='Octal permissions of the shared memory, e.g. 600 for this account only (never writable by others)')
+    parser.add_argument('--stats', action='store_true', help='Print the stats of a running server and exit')
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(stats(args.host, args.port), indent=2))
+        return
+
+    serve(args.host, args.port, int(args.memory * 2**20), args.mode)
+
+if __name__ == "__main__":
+     main()
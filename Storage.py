@@ -0,0 +1,16 @@
+# Storage.py - Python script for the storage settings of parsed wavefront obj files
+#
+# The precisions a WavefrontOBJ can store its vertex data in and the
+# attribute layouts of its faces. Kept apart from WavefrontOBJ so the
+# command line tools can check their arguments and Inspect can name the
+# layouts without importing numpy.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+precisions = ('float64', 'float32', 'quantized16')
+
+layouts = ('v', 'v/vt', 'v//vn', 'v/vt/vn')   # indexed by has texture + 2 * has normal
@@ -0,0 +1,127 @@
+# Synthetic.py - Python script for generating synthetic wavefront obj models
+#
+# The generated models are deterministic for a given seed and are used by
+# the benchmarks. Every face gets its own vertices, laid out on a grid so
+# the faces do not overlap. The mix of triangles, quads and n-gons, the
+# share of concave n-gons, texture coordinates, normals, negative
+# (relative) indices and the number of materials can all be varied.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import argparse
+import numpy as np
+
+#-------------------------------------------------------------------------------------
+
+def polygon(n, concave):  # unit polygon in the xy plane
+    angle = np.arange(n) * 2.0 * np.pi / n
+    radius = np.ones(n)
+    if concave:
+        radius[1::2] = 0.45  # star shape
+    return np.stack([radius * np.cos(angle), radius * np.sin(angle), np.zeros(n)], axis=1)
+
+def rotation(rng):
+    q, r = np.linalg.qr(rng.normal(size=(3, 3)))
+    q *= np.sign(np.diag(r))
+    if np.linalg.det(q) < 0: q[:, 2] = -q[:, 2]
+    return q
+
+def arities(rng, faces, mix, ngon):
+    mix = np.asarray(mix, dtype=float)
+    kind = rng.choice(3, size=faces, p=mix / mix.sum())
+    size = np.where(kind == 0, 3, 4)
+    size[kind == 2] = rng.integers(ngon[0], ngon[1] + 1, size=int(np.sum(kind == 2)))
+    return size
+
+#-------------------------------------------------------------------------------------
+
+def generate(file, faces=10000, mix=(0.5, 0.3, 0.2), concave=0.1, texture=True,
+             normal=True, negative=0.0, materials=4, ngon=(5, 8), seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    size = arities(rng, faces, mix, ngon)
+    is_concave = (size > 4) & (rng.random(faces) < concave)
+    is_negative = rng.random(faces) < negative
+    material = np.sort(rng.integers(0, max(1, materials), size=faces))
+
+    side = int(np.ceil(faces ** (1.0 / 3.0)))
+    cell = np.stack(np.unravel_index(np.arange(faces), (side, side, side)), axis=1) * 3.0
+
+    directory, basename = os.path.split(file)
+    name = os.path.splitext(basename)[0]
+
+    lines = [f"# synthetic model: faces {faces} seed {seed}", f"mtllib {name}.mtl"]
+
+    count = 0
+    current = None
+    for f in range(faces):
+        n = int(size[f])
+        corners = polygon(n, is_concave[f]) @ rotation(rng).T + cell[f]
+
+        if material[f] != current:
+            current = material[f]
+            lines.append(f"g group_{current}")
+            lines.append(f"usemtl material_{current}")
+
+        lines.extend(f"v {x:.6f} {y:.6f} {z:.6f}" for x, y, z in corners)
+        if texture:
+            lines.extend(f"vt {u:.6f} {v:.6f}" for u, v, _ in corners - cell[f])
+        if normal:
+            nx, ny, nz = np.cross(corners[1] - corners[0], corners[2] - corners[1])
+            length = np.sqrt(nx * nx + ny * ny + nz * nz) or 1.0
+            lines.extend([f"vn {nx / length:.6f} {ny / length:.6f} {nz / length:.6f}"] * n)
+
+        if is_negative[f]:
+            indices = range(-n, 0)
+        else:
+            indices = range(count + 1, count + n + 1)
+
+        if texture and normal:
+            items = [f"{i}/{i}/{i}" for i in indices]
+        elif texture:
+            items = [f"{i}/{i}" for i in indices]
+        elif normal:
+            items = [f"{i}//{i}" for i in indices]
+        else:
+            items = [f"{i}" for i in indices]
+
+        lines.append("f " + " ".join(items))
+        count += n
+
+    with open(file, 'w') as out:
+        out.write("\n".join(lines))
+        out.write("\n")
+
+    with open(os.path.join(directory, name + '.mtl'), 'w') as out:
+        for m in range(max(1, materials)):
+            r, g, b = rng.random(3)
+            out.write(f"newmtl material_{m}\nKd {r:.3f} {g:.3f} {b:.3f}\n\n")
+
+    return file
+
+#-------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic wavefront .obj model')
+    parser.add_argument('filename', help='The .obj file to write')
+    parser.add_argument('-f', '--faces', type=int, default=10000, help='Number of faces')
+    parser.add_argument('--mix', type=float, nargs=3, default=[0.5, 0.3, 0.2], metavar=('TRI', 'QUAD', 'NGON'), help='Share of triangles, quads and n-gons')
+    parser.add_argument('--concave', type=float, default=0.1, help='Share of n-gons that are concave')
+    parser.add_argument('--negative', type=float, default=0.0, help='Share of faces using negative indices')
+    parser.add_argument('--materials', type=int, default=4, help='Number of materials')
+    parser.add_argument('--no-texture', action='store_true', help='Do not write texture coordinates')
+    parser.add_argument('--no-normal', action='store_true', help='Do not write normals')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    generate(args.filename, args.faces, args.mix, args.concave, not args.no_texture,
+             not args.no_normal, args.negative, args.materials, seed=args.seed)
+
+if __name__ == "__main__":
+     main()
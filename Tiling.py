@@ -0,0 +1,214 @@
+# Tiling.py - Python script for splitting huge models into spatial tiles on disk
+#
+# The triangles of a model are sorted into an octree by centroid. Every
+# leaf becomes a tile with its own compact vertex array (only the vertices
+# it uses, float32), a local triangle index array, the geometry of every
+# triangle and flat triangle normals, stored as one .npz file. tiles.json
+# lists the tiles with their bounds, the materials of the geometries and
+# the center used to move the model to the origin.
+#
+# TileCache keeps the most recently used tiles in memory up to a byte
+# budget and evicts the least recently used ones, so a viewer can load the
+# tiles around the camera on demand instead of the whole model.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import json
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+import Compile
+
+maxTriangles = 50000    # Split octree nodes holding more triangles than this
+maxDepth = 10
+
+indexFile = 'tiles.json'
+
+#-------------------------------------------------------------------------------------
+
+class Tile:
+    def __init__(self, data, directory):
+        self.id = data['id']
+        self.file = os.path.join(directory, data['file'])
+        self.low = np.array(data['low'])
+        self.high = np.array(data['high'])
+        self.triangles = data['triangles']
+        self.vertices = data['vertices']
+
+    def distance(self, point):  # from a point to the tile bounds
+        point = np.asarray(point, dtype=np.float64)
+        return float(np.linalg.norm(point - np.clip(point, self.low, self.high)))
+
+    def load(self):
+        with np.load(self.file) as data:
+            return {name: data[name] for name in data.files}
+
+class TileSet:
+    def __init__(self, directory):
+        with open(os.path.join(directory, indexFile)) as file:
+            index = json.load(file)
+        self.directory = directory
+        self.center = np.array(index['center'])
+        self.low = np.array(index['low'])
+        self.high = np.array(index['high'])
+        self.mtllib = index['mtllib']
+        self.materials = index['materials']
+        self.tiles = [Tile(data, directory) for data in index['tiles']]
+
+    def around(self, center, radius, eye=None):  # tiles within radius of center, nearest to eye first
+        tiles = [tile for tile in self.tiles if tile.distance(center) <= radius]
+        eye = center if eye is None else eye
+        return sorted(tiles, key=lambda tile: tile.distance(eye))
+
+class TileCache:  # least recently used tiles, bounded by bytes
+    def __init__(self, tileset, budget, evicted=None):
+        self.tileset = tileset
+        self.budget = budget
+        self.evicted = evicted      # evicted(tile, data, payload) callback
+        self.items = OrderedDict()  # id -> (data, payload, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tile):
+        item = self.items.get(tile.id)
+        if item is not None:
+            self.items.move_to_end(tile.id)
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+        data = tile.load()
+        size = sum(array.nbytes for array in data.values())
+        self.items[tile.id] = (data, None, size)
+        self.size += size
+        self.trim(keep=tile.id)
+        return data
+
+    def attach(self, tile, payload):  # e.g. the scene objects built from the tile
+        data, _, size = self.items[tile.id]
+        self.items[tile.id] = (data, payload, size)
+
+    def payload(self, tile):
+        item = self.items.get(tile.id)
+        return item[1] if item is not None else None
+
+    def trim(self, keep=None):
+        for id in list(self.items):
+            if self.size <= self.budget: break
+            if id == keep: continue
+            data, payload, size = self.items.pop(id)
+            self.size -= size
+            if self.evicted is not None:
+                self.evicted(self.tileset.tiles[id], data, payload)
+
+#-------------------------------------------------------------------------------------
+
+def octree(centroid, low, high, limit=maxTriangles):  # lists of triangle indices, one per leaf
+    leaves = []
+    stack = [(np.arange(len(centroid)), low, high, 0)]
+    while stack:
+        items, lo, hi, depth = stack.pop()
+        if len(items) <= limit or depth >= maxDepth or np.all(hi - lo <= 0.0):
+            if len(items): leaves.append(items)
+            continue
+        mid = (lo + hi) / 2.0
+        above = centroid[items] > mid
+        child = above[:, 0] * 1 + above[:, 1] * 2 + above[:, 2] * 4
+        for octant in range(8):
+            selected = items[child == octant]
+            if not len(selected): continue
+            bits = np.array([octant & 1, octant & 2, octant & 4], dtype=bool)
+            stack.append((selected, np.where(bits, mid, lo), np.where(bits, hi, mid), depth + 1))
+    return leaves
+
+def source(file):  # what the tiles were built from, compared by exists()
+    if file is None: return None
+    stat = os.stat(file)
+    return {'path': os.path.abspath(file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def clear(directory):  # remove the tiles of a previous build
+    try:
+        previous = TileSet(directory)
+    except (OSError, ValueError, KeyError):
+        return
+    for tile in previous.tiles:
+        if os.path.exists(tile.file): os.remove(tile.file)
+
+def build(obj, directory, limit=maxTriangles, file=None):
+    os.makedirs(directory, exist_ok=True)
+    clear(directory)
+
+    index, geometry = Compile.triangles(obj)
+    vertex = np.asarray(obj.vertex, dtype=np.float64).reshape(-1, 3)
+
+    center, _ = obj.aabb()
+
+    triangle = vertex[index]
+    centroid = triangle.mean(axis=1)
+    low = triangle.min(axis=(0, 1)) if len(triangle) else np.zeros(3)
+    high = triangle.max(axis=(0, 1)) if len(triangle) else np.zeros(3)
+
+    tiles = []
+    for id, items in enumerate(octree(centroid, low, high, limit)):
+        used, local = np.unique(index[items], return_inverse=True)
+        position = (vertex[used] - center).astype(np.float32)
+        local = local.reshape(-1, 3).astype(np.uint32)
+        normal = Compile.flat_normals(position[local].astype(np.float64)).astype(np.float32)
+
+        name = f"tile_{id:05d}.npz"
+        with open(os.path.join(directory, name), 'wb') as out:
+            np.savez(out, vertex=position, index=local, geometry=geometry[items].astype(np.int32), normal=normal)
+
+        tiles.append({'id': id, 'file': name,
+                      'low': (triangle[items].min(axis=(0, 1)) - center).tolist(),
+                      'high': (triangle[items].max(axis=(0, 1)) - center).tolist(),
+                      'triangles': int(len(items)), 'vertices': int(len(used))})
+
+    data = {'source': source(file),
+            'mtllib': obj.mtllib,
+            'center': np.asarray(center).tolist(),
+            'low': (low - center).tolist(), 'high': (high - center).tolist(),
+            'materials': [g.material for g in obj.geometry],
+            'tiles': tiles}
+
+    with open(os.path.join(directory, indexFile), 'w') as out:
+        json.dump(data, out, indent=1)
+
+    return TileSet(directory)
+
+def exists(directory, file=None):  # tiles in directory, built from the current version of file when given
+    index = os.path.join(directory, indexFile)
+    if not os.path.exists(index): return False
+    if file is None: return True
+    try:
+        with open(index) as buffer:
+            return json.load(buffer).get('source') == source(file)
+    except (OSError, ValueError):
+        return False
+
+#-------------------------------------------------------------------------------------
+
+description = 'Split a Wavefront .obj file into spatial tiles'
+
+def main():
+    from WavefrontOBJ import WavefrontOBJ
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filename', help='The .obj file to split')
+    parser.add_argument('directory', help='Output directory for the tiles')
+    parser.add_argument('-t', '--triangles', type=int, default=maxTriangles, help='Maximum triangles per tile')
+    args = parser.parse_args()
+
+    obj = WavefrontOBJ()
+    obj.load(args.filename)
+    tileset = build(obj, args.directory, args.triangles, args.filename)
+    print(f"tiles: {len(tileset.tiles)} / triangles : {sum(tile.triangles for tile in tileset.tiles)}")
+
+if __name__ == "__main__":
+     main()
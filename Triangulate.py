@@ -270,15 +270,14 @@ def clockwiseOriented(polygon, normal):
 
     orientationSum = 0.0
 
+    origin = polygon[0]
+
+    # Signed area, the sum of the corner turns is wrong for deep concave corners
     for index in range(n):
-        prev = polygon[(index - 1 + n) % n]
         item = polygon[index % n]
         next = polygon[(index + 1) % n]
 
-        edge = item - prev
-        toNextPoint = next - item
-
-        v = cross(edge, toNextPoint)
+        v = cross(item - origin, next - origin)
         orientationSum += dot(v, normal)
 
     return orientationSum < 0.0
@@ -0,0 +1,128 @@
+# Watch.py - Python script for watching wavefront obj files while they are re-exported
+#
+# Polls the size and modification time of an obj file, its mtl file and
+# the textures of its materials. A change of the obj file is either an
+# append (the file grew and all bytes before the parsed end are unchanged,
+# so only the new lines are parsed, see WavefrontOBJ.append) or a rewrite
+# (the file is parsed again). The parsed part is compared by a hash of all
+# of it, exporters write fixed width numbers, so a part moved early in the
+# file does not change the size. The hash is extended after an append, only
+# a change of the file reads the parsed part again. Anything but an append
+# parses the whole file again, there is no partial reparse of an edited
+# range. After a rewrite the geometries are matched by a content hash of
+# their material and resolved positions, so a viewer only has to rebuild
+# the geometries that really changed.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import os
+import hashlib
+
+import numpy as np
+
+from WavefrontOBJ import flatten
+from WavefrontMTL import WavefrontMTL, mtlFile
+
+chunk = 2**20   # Bytes read at a time when hashing
+
+#-------------------------------------------------------------------------------------
+
+def stat(file):  # (size, mtime) or None when the file is missing
+    try:
+        info = os.stat(file)
+    except OSError:
+        return None
+    return info.st_size, info.st_mtime_ns
+
+def prefix(file, offset, digest=None, start=0):  # sha1 of the bytes before offset, continuing digest from start
+    digest = hashlib.sha1() if digest is None else digest.copy()
+    with open(file, 'rb') as buffer:
+        buffer.seek(start)
+        remaining = offset - start
+        while remaining > 0:
+            data = buffer.read(min(chunk, remaining))
+            if not data: break
+            digest.update(data)
+            remaining -= len(data)
+    return digest
+
+def ends_with_newline(file, size):
+    if size == 0: return True
+    with open(file, 'rb') as buffer:
+        buffer.seek(size - 1)
+        return buffer.read(1) == b'\n'
+
+def textures(mtl):
+    files = []
+    for material in mtl.materials:
+        for texture in (material.map_Kd, material.map_Ka, material.map_Ks, material.map_Ns, material.map_d):
+            if texture is not None: files.append(texture)
+    return files
+
+def digest(obj, geometry):  # content hash of a geometry, independent of where its data is in the file
+    h = hashlib.sha1(str(geometry.material).encode())
+    for attribute, data in (('vertex', obj.vertex), ('texture', obj.texture), ('normal', obj.normal)):
+        flat, size = flatten([getattr(face, attribute) for face in geometry.face])
+        h.update(size.tobytes())
+        if len(flat): h.update(np.ascontiguousarray(data[flat], dtype=np.float64).tobytes())
+    for items in (geometry.point, geometry.line):
+        flat, size = flatten(items)
+        h.update(size.tobytes())
+        if len(flat): h.update(np.ascontiguousarray(obj.vertex[flat], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def digests(obj):
+    return [digest(obj, geometry) for geometry in obj.geometry]
+
+#-------------------------------------------------------------------------------------
+
+class Source:  # the watched obj file and the files it depends on
+    def __init__(self, file):
+        self.file = file
+        self.state = None       # stat of the obj file when it was parsed
+        self.offset = 0         # bytes parsed
+        self.digest = None      # see prefix(), of the parsed bytes
+        self.append = False     # True when the parsed end is a line end, so appends can be parsed
+        self.materials = {}     # mtl and texture file -> stat
+
+    def parsed(self, obj, state):  # call after a full parse, with the stat taken before it
+        self.state = state
+        current = stat(self.file)
+        self.offset = state[0] if state else 0
+        self.append = state is not None and current == state and ends_with_newline(self.file, self.offset)
+        self.digest = prefix(self.file, self.offset) if self.append else None
+        self.watch_materials(obj)
+
+    def appended(self, offset):
+        self.digest = prefix(self.file, offset, self.digest, self.offset)
+        self.offset = offset
+        self.state = stat(self.file)
+        self.append = True
+
+    def failed(self, state):  # a parse failed, wait for the next change of the file
+        self.state = state
+        self.append = False
+
+    def watch_materials(self, obj):
+        files = []
+        if obj.mtllib is not None:
+            files.append(mtlFile(obj.mtllib))
+            if os.path.exists(files[0]):
+                mtl = WavefrontMTL()
+                mtl.load(files[0])
+                files += textures(mtl)
+        self.materials = {file: stat(file) for file in files}
+
+    def poll(self):  # None, 'append', 'reload' or 'materials'
+        current = stat(self.file)
+        if current is not None and current != self.state:
+            if self.append and current[0] > self.offset and prefix(self.file, self.offset).digest() == self.digest.digest():
+                return 'append'
+            return 'reload'
+        if any(stat(file) != state for file, state in self.materials.items()):
+            return 'materials'
+        return None
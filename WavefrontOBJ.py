@@ -6,13 +6,24 @@
 #
 # This software is released under the MIT License.
 
+import gc
 import os
 import sys
+import bisect
+import operator
+import itertools
 import numpy as np
+from array import array
+
+from Storage import precisions, layouts
 
 vector = np.array
 
+chunk = 65536   # rows converted at a time by storage()
+
 class Face:
+    __slots__ = ('vertex', 'texture', 'normal')  # no per-face __dict__, there are millions of them
+
     def __init__(self):
         self.vertex  = []
         self.texture = []
@@ -24,123 +35,377 @@ class Geometry:
         self.face  = []
         self.point = []
         self.line  = []
+        self.bucket = None  # see buckets(), None when the faces changed
+
+    def buckets(self):  # (size, layout) -> Bucket, sorted once and kept until the faces change
+        if getattr(self, 'bucket', None) is None:
+            self.bucket = sort_faces(self.face)
+        return self.bucket
+
+class Bucket:  # faces with the same size and attribute layout as dense index arrays
+    def __init__(self, size, layout):
+        self.size = size                        # 3, 4 or 0 for n-gons
+        self.layout = layout                    # One of layouts
+        self.face = np.zeros(0, dtype=np.int64) # Index into Geometry.face
+        self.vertex = None                      # (k, size) indices, flat for n-gons
+        self.texture = None                     # Like vertex when the layout has vt
+        self.normal = None                      # Like vertex when the layout has vn
+        self.start = None                       # n-gons: k + 1 offsets into the flat arrays
+
+    def __len__(self): return len(self.face)
+
+    def polygons(self, attribute='vertex'):  # n-gons: index array of every face
+        data = getattr(self, attribute)
+        return [data[a:b] for a, b in zip(self.start[:-1].tolist(), self.start[1:].tolist())]
+
+class Chain:  # read-only sequence over one attribute of several geometries, nothing is copied
+    def __init__(self, geometries, attribute):
+        self.geometries = geometries
+        self.attribute = attribute
+        self.start = [0] + list(itertools.accumulate(len(getattr(g, attribute)) for g in geometries))  # taken when the view is made
+
+    def __len__(self): return self.start[-1]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(getattr(g, self.attribute) for g in self.geometries)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(len(self)))]
+        i = operator.index(i)
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError('index out of range')
+        g = bisect.bisect_right(self.start, i) - 1
+        return getattr(self.geometries[g], self.attribute)[i - self.start[g]]
 
-def index(objIndex, indexToList):
+class MaterialGeometry:  # all geometries using one material, viewed as one geometry
+    def __init__(self, material, geometries):
+        self.material = material
+        self.geometries = geometries
+        self.face  = Chain(geometries, 'face')
+        self.point = Chain(geometries, 'point')
+        self.line  = Chain(geometries, 'line')
+        self.bucket = None
+
+    def buckets(self):  # the buckets of the geometries joined, face numbers count through all of them
+        if self.bucket is None:
+            self.bucket = join_buckets([g.buckets() for g in self.geometries], self.face.start)
+        return self.bucket
+
+def index(objIndex, count):
     i = int(objIndex)
     if i > 0: return i - 1
-    return i + len(indexToList)
+    return i + count
+
+def records(fname):  # (command, data) for every non-empty line of an obj file
+    with open(fname) as file_in:
+        for line in file_in:
+            line = line.strip()
+            
+            if not line: continue
+
+            words = line.split()
+            yield words[0], words[1:]
+
+def tail(fname, offset, position):  # records of the complete lines after offset, moves position[0] past them
+    with open(fname, 'rb') as file_in:
+        file_in.seek(offset)
+        for line in file_in:
+            if not line.endswith(b'\n'): break  # still being written
+            position[0] += len(line)
+            line = line.decode().strip()
+
+            if not line: continue
+
+            words = line.split()
+            yield words[0], words[1:]
+
+def nbytes(items, sample=1000):  # approximate memory of a list of numpy rows or index lists
+    if hasattr(items, 'nbytes'): return items.nbytes
+    if not items: return sys.getsizeof(items)
+    step = max(1, len(items) // sample)
+    picked = items[::step]
+    size = sum(sys.getsizeof(item) for item in picked)
+    bases = {id(item.base): item.base.nbytes for item in picked
+             if isinstance(item, np.ndarray) and item.base is not None}
+    return sys.getsizeof(items) + int(size * len(items) / len(picked)) + sum(bases.values())
+
+def flatten(lists):
+    size = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+    flat = np.fromiter(itertools.chain.from_iterable(lists), dtype=np.int64, count=int(size.sum()))
+    return flat, size
+
+def unflatten(flat, size):  # one tolist() per distinct size instead of a slice per item
+    result = np.empty(len(size), dtype=object)
+    start = np.cumsum(size) - size
+    for n in np.unique(size).tolist():
+        items = np.flatnonzero(size == n)
+        rows = flat[start[items, None] + np.arange(n)].tolist()
+        result[items] = np.fromiter(rows, dtype=object, count=len(items))
+    return result.tolist()
+
+def sort_faces(faces):  # faces with at least three corners in buckets by size and layout
+    count = len(faces)
+    size = np.fromiter((len(f.vertex) if f is not None else 0 for f in faces), dtype=np.int64, count=count)
+    texture = np.fromiter((len(f.texture) if f is not None else 0 for f in faces), dtype=np.int64, count=count)
+    normal = np.fromiter((len(f.normal) if f is not None else 0 for f in faces), dtype=np.int64, count=count)
+
+    layout = (texture == size) + 2 * (normal == size)
+    kind = np.where(size <= 4, size, 0)
+    valid = size >= 3
+
+    result = {}
+    for k in (3, 4, 0):
+        for l in range(len(layouts)):
+            face = np.flatnonzero(valid & (kind == k) & (layout == l))
+            if not len(face): continue
+            bucket = Bucket(k, layouts[l])
+            bucket.face = face
+            items = [faces[i] for i in face.tolist()]
+            attributes = ['vertex'] + ['texture'] * (l & 1) + ['normal'] * (l >> 1)
+            for attribute in attributes:
+                flat, _ = flatten([getattr(f, attribute) for f in items])
+                setattr(bucket, attribute, flat.reshape(-1, k) if k else flat)
+            if not k:
+                bucket.start = np.concatenate([[0], np.cumsum(size[face])])
+            result[(k, layouts[l])] = bucket
+    return result
+
+def join_buckets(parts, offsets):  # buckets of several face lists as the buckets of the lists one after another
+    result = {}
+    for k in (3, 4, 0):
+        for layout in layouts:
+            items = [(buckets[(k, layout)], offset) for buckets, offset in zip(parts, offsets) if (k, layout) in buckets]
+            if not items: continue
+            bucket = Bucket(k, layout)
+            bucket.face = np.concatenate([item.face + offset for item, offset in items])
+            for attribute in ('vertex', 'texture', 'normal'):
+                if getattr(items[0][0], attribute) is None: continue
+                setattr(bucket, attribute, np.concatenate([getattr(item, attribute) for item, _ in items]))
+            if not k:
+                shift = np.cumsum([0] + [item.start[-1] for item, _ in items[:-1]])
+                bucket.start = np.concatenate([[0]] + [item.start[1:] + s for (item, _), s in zip(items, shift)])
+            result[(k, layout)] = bucket
+    return result
+
+def mix(h):  # splitmix64 finalizer, spreads every input bit over the whole key
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return h ^ (h >> np.uint64(31))
+
+def grid_cells(vertex, tolerance):  # key of the grid cell of each vertex and the vertices sorted by key, tolerance 0 keys equal positions
+    if tolerance == 0.0:
+        cell = np.ascontiguousarray(vertex + 0.0).view(np.int64)   # bits of the coordinates, -0.0 is 0.0
+    else:
+        cell = np.floor(vertex / tolerance + 0.5).astype(np.int64)
+        cell -= cell.min(axis=0)
+        extent = cell.max(axis=0) + 1
+        if np.all(extent < 2**21):
+            key = (cell[:, 0] << 42) | (cell[:, 1] << 21) | cell[:, 2]
+            return key, np.argsort(key)
+    bits = cell.view(np.uint64)
+    key = mix(mix(mix(bits[:, 0]) ^ bits[:, 1]) ^ bits[:, 2]).view(np.int64)
+    order = np.argsort(key)
+    same = np.flatnonzero(key[order[1:]] == key[order[:-1]])
+    if np.any(cell[order[same]] != cell[order[same + 1]]):  # two cells with the same hash
+        _, key = np.unique(cell, axis=0, return_inverse=True)
+        key = key.reshape(-1)
+        order = np.argsort(key)
+    return key, order
+
+class QuantizedArray:  # 16-bit coordinates relative to the bounding box
+
+    def __init__(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if len(data):
+            low, high = data.min(axis=0), data.max(axis=0)
+        else:
+            low = high = np.zeros(data.shape[1])
+        scale = (high - low) / 65535.0
+        self.exact = scale == 0.0
+        scale[self.exact] = 1.0
+        self.low = low
+        self.scale = scale
+        self.data = np.empty(data.shape, dtype=np.uint16)
+        for start in range(0, len(data), chunk):  # float64 temporaries only for one chunk at a time
+            rows = (data[start:start + chunk] - low) / scale
+            np.round(rows, out=rows)
+            self.data[start:start + chunk] = rows
+
+    def __len__(self): return len(self.data)
+
+    def __getitem__(self, i):  # dequantize the requested rows in bulk
+        return self.data[i] * self.scale + self.low
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def __iadd__(self, translation):
+        self.low = self.low + translation
+        return self
+
+    @property
+    def shape(self): return self.data.shape
+
+    @property
+    def nbytes(self): return self.data.nbytes + self.low.nbytes + self.scale.nbytes
+
+    def error(self): return np.where(self.exact, 0.0, self.scale / 2.0)
+
+def storage(data, precision):  # returns (array, max absolute error per axis)
+    if precision == 'float64':
+        return data, np.zeros(data.shape[1])
+    if precision == 'float32':
+        stored = data.astype(np.float32)
+        error = np.zeros(data.shape[1])
+        for start in range(0, len(data), chunk):
+            rows = np.abs(stored[start:start + chunk] - data[start:start + chunk])
+            np.maximum(error, rows.max(axis=0), out=error)
+        return stored, error
+    if precision == 'quantized16':
+        stored = QuantizedArray(data)
+        return stored, stored.error()
+    raise ValueError(f"unknown precision: {precision}")
 
 class WavefrontOBJ:
 
     def __init__(self):
         self.mtllib = None
-        self.vertex   = []
-        self.texture  = []
-        self.normal   = []
+        self.precision = 'float64'
+        self.vertex   = np.zeros((0, 3))
+        self.texture  = np.zeros((0, 3))
+        self.normal   = np.zeros((0, 3))
         self.geometry = []
+        self.materials = {}   # material -> indices into geometry, see geometries()
+        self.error = {}
+
+    def store(self, name, data):
+        data = np.asarray(data, dtype=np.float64).reshape(-1, 3)
+        stored, error = storage(data, self.precision)
+        setattr(self, name, stored)
+        self.error[name] = error
 
-    def load(self, fname):
+    def load(self, fname, precision='float64'):
         
         if fname is None: return
 
-        geometry = Geometry()
+        if precision not in precisions:
+            raise ValueError(f"unknown precision: {precision}")
+
+        self.precision = precision
 
         if not os.path.exists(fname):
             print(f"obj file not found: {fname}")
             return
 
         self.mtllib = fname
+        self.geometry = []
+        self.vertex = self.texture = self.normal = np.zeros((0, 3))
+
+        self.read(fname, records(fname))
 
-        with open(fname) as file_in:
-            for line in file_in:
-                line = line.strip()
+    def append(self, fname, offset):  # parse the complete lines added after offset, returns the new offset
+        position = [offset]
+        self.read(fname, tail(fname, offset, position))
+        return position[0]
+
+    def read(self, fname, lines):  # continues the last geometry and the indices already loaded
+
+        vertex  = array('d')
+        texture = array('d')
+        normal  = array('d')
+
+        geometry = self.geometry.pop() if self.geometry else Geometry()
+        geometry.bucket = None
+
+        nv, nt, nn = len(self.vertex), len(self.texture), len(self.normal)
+
+        for command, data in lines:
+            if command == 'mtllib':  # Material library
+                path = os.path.split(fname)[0]
+                self.mtllib = os.path.join(path, data[0])
                 
-                if not line: continue
-
-                words = line.split()
-                command = words[0]
-                data = words[1:]
-
-                if command == 'mtllib':  # Material library
-                    path = os.path.split(fname)[0]
-                    self.mtllib = os.path.join(path, data[0])
-                    
-                elif command == 'usemtl':  # Use material
-                    if geometry.material != None:
-                        self.geometry.append(geometry)
-                    geometry = Geometry()
-                    geometry.material = data[0]
-
-                elif command == 'v':  # Vertex
-                    x, y, z = map(float, data[:3])
-                    self.vertex.append(vector([x, y, z]))
-
-                elif command == 'vt':  # Texture
-                    x, y = map(float, data[:2])
-                    self.texture.append(vector([x, y, 0]))
-
-                elif command == 'vn':  # Normal
-                    x, y, z = map(float, data[:3])
-                    self.normal.append(vector([x, y, z]))
-
-                elif command == 'p':  # Point
-                    indices = [index(item, self.vertex) for item in data]
-                    geometry.point.append(indices)
-
-                elif command == 'l':  # Line
-                    indices = [index(item, self.vertex) for item in data]
-                    if len(indices) == 2:
-                        geometry.line.append(indices)
-
-                elif command == 'f':  # Face
-                    face = Face()
-                    for group in data:
-                        indices = group.split('/')
-                        if len(indices) == 0:
-                            continue
-                        if len(indices) > 0 and indices[0]:
-                            face.vertex.append(index(indices[0], self.vertex))
-                        if len(indices) > 1 and indices[1]:
-                            face.texture.append(index(indices[1], self.texture))
-                        if len(indices) > 2 and indices[2]:
-                            face.normal.append(index(indices[2], self.normal))
-                    geometry.face.append(face)
+            elif command == 'usemtl':  # Use material
+                if geometry.material != None or geometry.face or geometry.point or geometry.line:
+                    self.geometry.append(geometry)
+                geometry = Geometry()
+                geometry.material = data[0] if data else None   # blank usemtl, default material
+
+            elif command == 'v':  # Vertex
+                x, y, z = map(float, data[:3])
+                vertex.extend((x, y, z))
+                nv += 1
+
+            elif command == 'vt':  # Texture
+                x, y = map(float, data[:2])
+                texture.extend((x, y, 0.0))
+                nt += 1
+
+            elif command == 'vn':  # Normal
+                x, y, z = map(float, data[:3])
+                normal.extend((x, y, z))
+                nn += 1
+
+            elif command == 'p':  # Point
+                indices = [index(item, nv) for item in data]
+                geometry.point.append(indices)
+
+            elif command == 'l':  # Line
+                indices = [index(item, nv) for item in data]
+                if len(indices) == 2:
+                    geometry.line.append(indices)
+
+            elif command == 'f':  # Face
+                face = Face()
+                for group in data:
+                    indices = group.split('/')
+                    if len(indices) == 0:
+                        continue
+                    if len(indices) > 0 and indices[0]:
+                        face.vertex.append(index(indices[0], nv))
+                    if len(indices) > 1 and indices[1]:
+                        face.texture.append(index(indices[1], nt))
+                    if len(indices) > 2 and indices[2]:
+                        face.normal.append(index(indices[2], nn))
+                geometry.face.append(face)
 
         self.geometry.append(geometry)
+        self.group()
+
+        for geometry in self.geometry:
+            geometry.buckets()
+
+        self.store('vertex', self.extended(self.vertex, vertex))
+        del vertex      # the raw floats go as soon as their attribute is stored
+        self.store('texture', self.extended(self.texture, texture))
+        del texture
+        self.store('normal', self.extended(self.normal, normal))
+
+    def extended(self, stored, values):  # float64 rows of stored followed by the new values
+        values = np.frombuffer(values).reshape(-1, 3)
+        if len(stored) == 0: return values
+        return np.concatenate([np.asarray(stored, dtype=np.float64).reshape(-1, 3), values])
 
     def aabb(self):  # axis-aligned bounding box
         
         zero = np.array([0.0, 0.0, 0.0])
         
-        if not self.vertex:
+        if len(self.vertex) == 0:
             return zero, zero
 
-        max = sys.float_info.max
-        
-        start = np.array([max, max, max])
-        
-        min_coord = +start
-        max_coord = -start
+        used = [flatten([face.vertex for face in geometry.face])[0] for geometry in self.geometry]
+        used += [flatten(geometry.line)[0] for geometry in self.geometry]
+        used += [flatten(geometry.point)[0] for geometry in self.geometry]
+        used = np.unique(np.concatenate(used))
 
-        for geometry in self.geometry:
-            for face in geometry.face:
-                for i in face.vertex:
-                    vertex = self.vertex[i]
-                    min_coord = np.minimum(min_coord, vertex)
-                    max_coord = np.maximum(max_coord, vertex)
-            for line in geometry.line:
-                for i in line:
-                    vertex = self.vertex[i]
-                    min_coord = np.minimum(min_coord, vertex)
-                    max_coord = np.maximum(max_coord, vertex)
-            for point in geometry.point:
-                for i in point:
-                    vertex = self.vertex[i]
-                    min_coord = np.minimum(min_coord, vertex)
-                    max_coord = np.maximum(max_coord, vertex)
-
-        if np.all(min_coord == start) or np.all(max_coord == start):
+        if len(used) == 0:
             return zero, zero
+
+        vertex = self.vertex[used]
+
+        min_coord = vertex.min(axis=0)
+        max_coord = vertex.max(axis=0)
             
         # Calculate center and size
         center = (max_coord + min_coord) / 2
@@ -150,17 +415,128 @@ class WavefrontOBJ:
     
     def translate(self, translation):    
         if translation is None: return
-        if not self.vertex: return
+        if len(self.vertex) == 0: return
         self.vertex += translation
 
-    def geometries(self):
-        geometries = {}
+    def memory(self):  # approximate bytes held by the vertex data and faces
+        face = 0
         for geometry in self.geometry:
-            if geometry.material not in geometries:
-                geometries[geometry.material] = Geometry()
-                geometries[geometry.material].material = geometry.material
-            geometries[geometry.material].face.extend(geometry.face)
-            geometries[geometry.material].point.extend(geometry.point)
-            geometries[geometry.material].line.extend(geometry.line)
-
-        return geometries
\ No newline at end of file
+            faces = geometry.face
+            if not faces: continue
+            step = max(1, len(faces) // 1000)
+            picked = faces[::step]
+            sample = sum(sys.getsizeof(item) +
+                         sys.getsizeof(item.vertex) + sys.getsizeof(item.texture) +
+                         sys.getsizeof(item.normal) for item in picked)
+            face += sys.getsizeof(faces) + int(sample * len(faces) / len(picked))
+        return {'vertex': nbytes(self.vertex),
+                'texture': nbytes(self.texture),
+                'normal': nbytes(self.normal),
+                'face': face}
+
+    def weld(self, tolerance=1e-6):  # merge close vertices and drop unused vertex data
+
+        if not tolerance >= 0.0:
+            raise ValueError(f"weld tolerance must be 0 or more: {tolerance}")
+
+        before = self.memory()
+        counts = (len(self.vertex), len(self.texture), len(self.normal))
+
+        faces = [face for geometry in self.geometry for face in geometry.face]
+        points = [point for geometry in self.geometry for point in geometry.point]
+        lines = [line for geometry in self.geometry for line in geometry.line]
+
+        face_vertex, face_vertex_size = flatten([face.vertex for face in faces])
+        face_texture, face_texture_size = flatten([face.texture for face in faces])
+        face_normal, face_normal_size = flatten([face.normal for face in faces])
+        point, point_size = flatten(points)
+        line, line_size = flatten(lines)
+        welded = {'vertex': face_vertex, 'texture': face_texture, 'normal': face_normal}
+
+        if len(self.vertex):
+            vertex = np.asarray(self.vertex, dtype=np.float64).reshape(-1, 3)
+
+            key, order = grid_cells(vertex, tolerance)
+            boundary = np.empty(len(key), dtype=bool)
+            boundary[0] = True
+            np.not_equal(key[order[1:]], key[order[:-1]], out=boundary[1:])
+            first = np.minimum.reduceat(order, np.flatnonzero(boundary))  # lowest index in each cell
+            rank = np.empty(len(first), dtype=np.int64)
+            rank[np.argsort(first)] = np.arange(len(first))
+            cell = np.empty(len(key), dtype=np.int64)
+            cell[order] = rank[np.cumsum(boundary) - 1]  # cells in the order of the vertices, nothing moves without merges
+            first = np.sort(first)
+
+            used = np.zeros(len(first), dtype=bool)
+            used[cell[np.concatenate([face_vertex, point, line])]] = True
+
+            remap = np.cumsum(used) - 1
+            self.store('vertex', vertex[first[used]])
+
+            welded['vertex'] = remap[cell[face_vertex]]
+            point = remap[cell[point]]
+            line = remap[cell[line]]
+
+        def compact(name, indices):
+            data = getattr(self, name)
+            used = np.zeros(len(data), dtype=bool)
+            used[indices] = True
+            remap = np.cumsum(used) - 1
+            self.store(name, data[np.flatnonzero(used)])
+            return remap[indices]
+
+        welded['texture'] = compact('texture', face_texture)
+        welded['normal'] = compact('normal', face_normal)
+
+        collecting = gc.isenabled()
+        gc.disable()    # millions of new index lists, none of them in a cycle
+        try:
+            for name, (flat, size) in (('vertex', (face_vertex, face_vertex_size)),
+                                       ('texture', (face_texture, face_texture_size)),
+                                       ('normal', (face_normal, face_normal_size))):
+                if np.array_equal(welded[name], flat): continue   # only renumber what changed
+                for face, items in zip(faces, unflatten(welded[name], size)):
+                    setattr(face, name, items)
+
+            point = iter(unflatten(point, point_size))
+            line = iter(unflatten(line, line_size))
+            for geometry in self.geometry:
+                geometry.point = [next(point) for _ in geometry.point]
+                geometry.line = [next(line) for _ in geometry.line]
+                geometry.bucket = None
+        finally:
+            if collecting: gc.enable()
+
+        after = self.memory()
+
+        return {'vertex': (counts[0], len(self.vertex)),
+                'texture': (counts[1], len(self.texture)),
+                'normal': (counts[2], len(self.normal)),
+                'memory': (sum(before.values()), sum(after.values()))}
+
+    def group(self):  # geometry indices by material, in order of first use
+        self.materials = {}
+        for i, geometry in enumerate(self.geometry):
+            self.materials.setdefault(geometry.material, []).append(i)
+
+    def geometries(self):  # material -> MaterialGeometry views, the face lists are not copied, ask again after editing faces
+        if sum(len(indices) for indices in getattr(self, 'materials', {}).values()) != len(self.geometry):
+            self.group()
+        return {material: MaterialGeometry(material, [self.geometry[i] for i in indices])
+                for material, indices in self.materials.items()}
+
+    def export(self, fname, mtl=None):  # binary mesh formats, chosen by extension
+        import Export
+        Export.export(self, fname, mtl)
+
+    def export_ply(self, fname):
+        import Export
+        Export.write_ply(self, fname)
+
+    def export_stl(self, fname):
+        import Export
+        Export.write_stl(self, fname)
+
+    def export_glb(self, fname, mtl=None):
+        import Export
+        Export.write_glb(self, fname, mtl)
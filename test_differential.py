@@ -0,0 +1,118 @@
+# test_differential.py - Python script for testing the fast paths against reference code
+#
+# Runs the differential check of Differential.py over a fixed range of
+# seeds, and checks the parser and Triangulate on small hand written files
+# whose expected output is worked out by hand, so a change that breaks the
+# reference and the optimized engine the same way is caught too.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import numpy as np
+
+import Compile
+import Differential
+
+#-------------------------------------------------------------------------------------
+
+# Faces before the first usemtl, a blank usemtl, a repeated usemtl,
+# negative indices and every face layout
+materials = """\
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+vt 0 0
+vt 1 0
+vt 1 1
+vn 0 0 1
+f 1 2 3
+p 4
+usemtl red
+f 1/1 2/2 3/3
+f -4//-1 -2//-1 -1//-1
+usemtl
+l 1 2
+f 1/1/1 3/3/1 4/2/1
+usemtl red
+f 2 3 4
+"""
+
+materialsGeometry = [
+    {'material': None, 'face': [([0, 1, 2], [], [])], 'point': [[3]], 'line': []},
+    {'material': 'red', 'face': [([0, 1, 2], [0, 1, 2], []), ([0, 2, 3], [], [0, 0, 0])], 'point': [], 'line': []},
+    {'material': None, 'face': [([0, 2, 3], [0, 2, 1], [0, 0, 0])], 'point': [], 'line': [[0, 1]]},
+    {'material': 'red', 'face': [([1, 2, 3], [], [])], 'point': [], 'line': []}]
+
+# Starts with usemtl, loads as it always did: no geometry without a
+# material in front, and a usemtl without faces keeps its empty geometry
+leading = """\
+usemtl a
+usemtl b
+v 0 0 0
+v 1 0 0
+v 0 1 0
+f 1 2 3
+"""
+
+leadingGeometry = [
+    {'material': 'a', 'face': [], 'point': [], 'line': []},
+    {'material': 'b', 'face': [([0, 1, 2], [], [])], 'point': [], 'line': []}]
+
+# Four spikes of area 9 around a 2 x 2 square, the sum of the corner
+# turns has the wrong sign for it
+star = """\
+v 0 10 0
+v 1 1 0
+v 10 0 0
+v 1 -1 0
+v 0 -10 0
+v -1 -1 0
+v -10 0 0
+v -1 1 0
+f 1 2 3 4 5 6 7 8
+"""
+
+#-------------------------------------------------------------------------------------
+
+def write(tmp_path, text):
+    file = tmp_path / 'case.obj'
+    file.write_text(text)
+    return str(file)
+
+def plain(snapshot):  # geometries with every face as a tuple of lists
+    return [dict(g, face=[tuple(list(items) for items in face) for face in g['face']]) for g in snapshot['geometry']]
+
+def test_differential_fixed_seeds():
+    assert Differential.run(20, seed=0) == []
+
+def test_usemtl_fixture(tmp_path):
+    file = write(tmp_path, materials)
+    obj = Differential.load(file)
+
+    assert plain(Differential.reference_obj(file)) == materialsGeometry
+    assert plain(Differential.snapshot(obj)) == materialsGeometry
+    assert obj.materials == {None: [0, 2], 'red': [1, 3]}
+    assert np.array_equal(obj.texture, [[0, 0, 0], [1, 0, 0], [1, 1, 0]])
+
+def test_leading_usemtl_fixture(tmp_path):
+    file = write(tmp_path, leading)
+
+    assert plain(Differential.reference_obj(file)) == leadingGeometry
+    assert plain(Differential.snapshot(Differential.load(file))) == leadingGeometry
+
+def test_concave_star(tmp_path):
+    obj = Differential.load(write(tmp_path, star))
+    vertex = obj.geometry[0].face[0].vertex
+
+    corners, normal = Compile.triangulate(obj, vertex)
+    assert len(corners) == 6
+
+    triangle = obj.vertex[np.array(vertex)[np.array(corners).reshape(-1, 3)]]
+    cross = np.cross(triangle[:, 1] - triangle[:, 0], triangle[:, 2] - triangle[:, 0])
+
+    assert len(set(np.sign(cross @ normal))) == 1   # no triangle is flipped
+    assert np.isclose(np.abs(cross[:, 2]).sum() / 2.0, 4.0 + 4 * 9.0)
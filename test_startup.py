@@ -0,0 +1,21 @@
+# test_startup.py - Python script for testing the startup of the command line tools
+#
+# Runs the startup check of Benchmark.py under pytest: --help and argument
+# errors of Explorer, Inspect and Batch must stay within the import budget
+# and must not import VPython or numpy.
+#
+# Copyright (c) 2023 by FalconCoding
+# Author: Stefan Johnsen
+# Email: stefan.johnsen@outlook.com
+#
+# This software is released under the MIT License.
+
+import Benchmark
+
+def test_startup_budget():
+    assert Benchmark.startup(Benchmark.startupBudget) == []
+
+def test_startup_forbidden_imports():
+    for script, arguments in Benchmark.startupScripts:
+        names = {name.strip().split('.')[0] for name, _ in Benchmark.import_times(script, arguments)}
+        assert not names & set(Benchmark.startupForbidden), (script, arguments)